@@ -0,0 +1,158 @@
+"""
+歌曲資源預載器 - 在選單 hover 計時期間於背景載入音樂、譜面與影片
+讓遊戲階段從「已暖好」的資源開始，避免選單切換到遊戲時畫面卡住
+"""
+
+import os
+import threading
+import pygame
+from music_controller import init_mixer
+from new_game_logic import load_beatmap_from_file, load_chart_from_file
+from video_player import VideoPlayerThread
+
+
+def resolve_song_paths(song, base_dir):
+    """根據歌曲目錄項目計算音樂、譜面與影片路徑"""
+    if song['folder']:
+        music_path = os.path.join(base_dir, song['folder'], song['filename'])
+    else:
+        music_path = os.path.join(base_dir, song['filename'])
+
+    filename_no_ext = os.path.splitext(song['filename'])[0]
+    # 譜面依難度加後綴（normal 或未指定時沿用原本的檔名，與 generate_beatmap_librosa 相同）
+    difficulty = song.get('difficulty')
+    chart_base = filename_no_ext if difficulty in (None, "normal") else f"{filename_no_ext}_{difficulty}"
+    return {
+        'music_path': music_path,
+        'beatmap_name': chart_base + ".txt",
+        'chart_name': chart_base + "_chart.json",
+        'video_path': os.path.join(base_dir, "video", f"{filename_no_ext}.mp4"),
+    }
+
+
+class _PreloadJob:
+    """單一歌曲的預載工作"""
+
+    def __init__(self, song):
+        self.song = song
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.assets = None
+
+
+class AssetPreloader:
+    """歌曲資源預載器 - hover 到某首歌時開始背景載入，hover 離開時取消"""
+
+    def __init__(self, base_dir, video_size=None, video_cache=None):
+        self.base_dir = base_dir
+        self.video_size = video_size    # 背景影片的輸出尺寸 (寬, 高)
+        self.video_cache = video_cache  # VideoFrameCache 或 None（不快取）
+        self.job = None
+        self.lock = threading.Lock()
+
+        # pygame.mixer.Sound 需要 mixer 已初始化，先在主執行緒初始化
+        init_mixer()
+
+    def request(self, song):
+        """開始預載指定歌曲（同一首歌重複呼叫不會重新載入）"""
+        with self.lock:
+            if self.job is not None and self.job.song is song and not self.job.cancelled.is_set():
+                return
+            self._cancel_locked()
+            job = _PreloadJob(song)
+            self.job = job
+        threading.Thread(target=self._run, args=(job,), daemon=True, name="AssetPreloader").start()
+
+    def cancel(self):
+        """取消目前的預載工作（hover 離開時呼叫）"""
+        with self.lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        if self.job is None:
+            return
+        self.job.cancelled.set()
+        # 已經載完的資源由這裡釋放；還在載入中的由背景執行緒自行釋放
+        if self.job.done.is_set():
+            self._release(self.job.assets)
+        self.job = None
+
+    def take(self, song):
+        """
+        取得歌曲資源（主執行緒在選定歌曲後呼叫）
+        若預載中就等它完成；若預載的不是這首歌，則同步載入
+        """
+        with self.lock:
+            job = self.job
+            self.job = None
+
+        if job is not None and job.song is song and not job.cancelled.is_set():
+            job.done.wait()
+            if job.assets is not None:
+                return job.assets
+        elif job is not None:
+            job.cancelled.set()
+            if job.done.is_set():
+                self._release(job.assets)
+
+        # 沒有可用的預載結果，直接同步載入
+        return self._load(_PreloadJob(song))
+
+    def _run(self, job):
+        """背景執行緒：載入資源，完成後若已被取消就釋放"""
+        assets = self._load(job)
+        with self.lock:
+            job.assets = assets
+            job.done.set()
+            if job.cancelled.is_set():
+                self._release(assets)
+                job.assets = None
+
+    def _load(self, job):
+        """依序載入譜面、音樂長度與影片，每一步之間檢查是否被取消"""
+        song = job.song
+        paths = resolve_song_paths(song, self.base_dir)
+        assets = {
+            'song': song,
+            'music_path': paths['music_path'],
+            'beatmap_name': paths['beatmap_name'],
+            'rhythm_pattern': None,
+            'chart': None,
+            'song_duration': None,
+            'video': None,
+        }
+
+        # 1. 譜面解析（有編譯好的譜面就優先使用，0/1 譜面作為備援）
+        # 歌曲目錄已記錄檔案是否存在（指定難度的項目記錄的是該難度的檔案）
+        if song.get('has_chart', True):
+            assets['chart'] = load_chart_from_file(os.path.join("beatmap", paths['chart_name']))
+        assets['rhythm_pattern'] = load_beatmap_from_file(os.path.join("beatmap", paths['beatmap_name']))
+        if job.cancelled.is_set():
+            return assets
+
+        # 2. 歌曲長度：歌曲目錄已從檔頭或 meta 取得；沒有時才解碼整首（這是最耗時的一步）
+        assets['song_duration'] = song.get('duration')
+        if assets['song_duration'] is None:
+            try:
+                sound = pygame.mixer.Sound(paths['music_path'])
+                assets['song_duration'] = sound.get_length()
+                del sound
+            except Exception as e:
+                print(f"音樂預載失敗: {e}")
+        if job.cancelled.is_set():
+            return assets
+
+        # 3. 背景影片：開啟解碼器並讀取、縮放第一幀（尚未啟動執行緒）
+        has_video = song['has_video'] if 'has_video' in song else os.path.exists(paths['video_path'])
+        if has_video:
+            assets['video'] = VideoPlayerThread(
+                paths['video_path'], output_size=self.video_size, cache=self.video_cache
+            )
+
+        return assets
+
+    def _release(self, assets):
+        """釋放未被使用的資源（目前只有影片解碼器需要釋放）"""
+        if assets and assets['video'] is not None:
+            assets['video'].stop()
+            assets['video'] = None
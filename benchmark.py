@@ -0,0 +1,262 @@
+"""
+效能基準測試 - 不需要攝影機與視窗（SDL dummy driver），用合成畫面或錄好的影片計時各熱點
+用法：
+    python benchmark.py run --output bench.json [--clip 錄影.mp4] [--size 1920x1080]
+    python benchmark.py compare baseline.json bench.json [--threshold 0.15]
+compare 以 p50 比較，變慢超過門檻的項目標示為 REGRESSION，並以結束碼 1 結束
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import random
+import argparse
+import platform
+
+# 必須在 import pygame 之前設定，才能在沒有螢幕的 Linux 上執行
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import cv2
+import numpy as np
+
+from new_game_logic import GameEngine, load_beatmap_from_file
+from compositor import Compositor
+from pygame_display import PygameDisplay
+from pygame_ui import PygameUI
+from ui_renderer import GameUI
+
+
+NOTE_DENSITIES = [10, 50, 200]
+
+
+def measure(func, repeat=200, warmup=10):
+    """執行 func 多次，回傳 {runs, mean_ms, p50_ms, p95_ms, min_ms}"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': sum(samples) / repeat,
+        'p50_ms': samples[repeat // 2],
+        'p95_ms': samples[min(repeat - 1, int(repeat * 0.95))],
+        'min_ms': samples[0],
+    }
+
+
+def synthetic_frame(width, height, seed):
+    """固定亂數種子的雜訊畫面（每次執行內容相同）"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def load_clip_frames(path, width, height, max_frames=120):
+    """讀取錄好的影片並縮放到內部解析度"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        if (frame.shape[1], frame.shape[0]) != (width, height):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def make_engine(width, height, note_count):
+    """建立一個場上有 note_count 個音符的遊戲引擎（半徑平均分布在飛行路徑上）"""
+    random.seed(note_count)
+    engine = GameEngine(width=width, height=height, arc_radius=int(width * 0.4), zone_count=8,
+                        note_speed=7, rhythm_pattern=[1, 0, 1, 0])
+    for i in range(note_count):
+        engine._spawn_note(i % engine.ZONE_COUNT)
+    span = engine.ARC_RADIUS + engine.LINE_HIT_TOLERANCE - engine.NOTE_START_RADIUS
+    for i, note in enumerate(engine.notes):
+        note['current_radius'] = engine.NOTE_START_RADIUS + span * i / max(1, note_count)
+    return engine
+
+
+def bench_engine(results, width, height, repeat):
+    # delta_time = 0：音符不移動也不會被移除，每次迭代的場上數量固定
+    hand = (width // 2, height // 4)  # 不會碰到音符的位置，判定迴圈要走完全部音符
+    for count in NOTE_DENSITIES:
+        engine = make_engine(width, height, count)
+        results[f"engine.update_game_state[{count}]"] = measure(
+            lambda: engine.update_game_state(hand, 0.0), repeat)
+        results[f"engine.get_notes_for_drawing[{count}]"] = measure(engine.get_notes_for_drawing, repeat)
+
+
+def bench_compositor(results, camera, video, repeat):
+    h, w = camera.shape[:2]
+    compositor = Compositor(w, h, video_alpha=0.3)
+    out = np.empty_like(camera)
+    results["compositor.compose"] = measure(lambda: compositor.compose(camera, video, out=out), repeat)
+
+
+def bench_pygame(results, frame, width, height, repeat):
+    display = PygameDisplay(width, height, "benchmark")
+    results["display.blit_frame"] = measure(lambda: display.blit_frame(frame), repeat)
+
+    ui = PygameUI(width=width, height=height)
+    engine = make_engine(width, height, 50)
+    state = {
+        'arc_info': engine.get_arc_info(),
+        'notes_data': engine.get_notes_for_drawing(),
+        'score': 123,
+        'accuracy': 87.5,
+        'combo': 12,
+        'song_name': "Benchmark",
+        'fps': 60,
+        'time_progress': 0.5
+    }
+    screen = display.get_screen()
+    results["pygame_ui.draw_game_ui"] = measure(lambda: ui.draw_game_ui(screen, **state), repeat)
+    display.close()
+
+
+def bench_overlay(results, frame, width, height, repeat):
+    ui = GameUI(width=width, height=height)
+    songs = [
+        {'name': "Haruhikage", 'bpm': 97},
+        {'name': "Zankoku na Tenshi no Te-ze", 'bpm': 128},
+    ]
+    image = frame.copy()
+
+    def draw_menu():
+        np.copyto(image, frame)
+        ui.draw_menu(image, songs, 1, 0.4, 60)
+
+    stats = {'total': 120, 'hit': 100, 'miss': 20, 'combo': 45, 'score': 130}
+
+    def draw_result():
+        np.copyto(image, frame)
+        ui.draw_result_panel(image, stats, 0.4, 60)
+
+    results["game_ui.draw_menu"] = measure(draw_menu, repeat)
+    results["game_ui.draw_result_panel"] = measure(draw_result, repeat)
+
+
+def bench_beatmaps(results, repeat):
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(current_dir, "beatmap", "*.txt"))):
+        name = os.path.basename(path)
+        if name.endswith(("_time.txt", "_readable.txt")):
+            continue
+        relative = os.path.join("beatmap", name)
+        results[f"load_beatmap_from_file[{name}]"] = measure(lambda: load_beatmap_from_file(relative), repeat)
+
+
+def bench_pose(results, frames, width, height, repeat):
+    from camera_sensor import PoseDetector
+    detector = PoseDetector(output_size=(width, height))
+    index = [0]
+
+    def process():
+        detector.process_frame(frames[index[0] % len(frames)])
+        index[0] += 1
+
+    results["pose.process_frame"] = measure(process, repeat, warmup=5)
+
+
+def run(args):
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    camera = synthetic_frame(width, height, 1)
+    video = synthetic_frame(width, height, 2)
+
+    clip_frames = []
+    for clip in args.clip:
+        clip_frames.extend(load_clip_frames(clip, width, height))
+    if args.clip and not clip_frames:
+        print(f"無法讀取影片: {', '.join(args.clip)}，姿態偵測改用合成畫面")
+
+    results = {}
+    print(f"基準測試: {width}x{height}, 每項 {args.repeat} 次")
+    bench_engine(results, width, height, args.repeat)
+    bench_compositor(results, camera, video, args.repeat)
+    bench_pygame(results, camera, width, height, args.repeat)
+    bench_overlay(results, camera, width, height, args.repeat)
+    bench_beatmaps(results, max(10, args.repeat // 10))
+    if not args.no_pose:
+        bench_pose(results, clip_frames or [camera], width, height, max(10, args.repeat // 4))
+
+    for name, st in results.items():
+        print(f"{name:48s} p50 {st['p50_ms']:8.3f} ms  p95 {st['p95_ms']:8.3f} ms")
+
+    report = {
+        'time': time.time(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'size': [width, height],
+        'clips': args.clip,
+        'results': results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"結果已儲存: {args.output}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get('size') != current.get('size'):
+        print(f"注意：解析度不同 ({baseline.get('size')} vs {current.get('size')})")
+
+    regressions = 0
+    print(f"{'項目':48s} {'基準':>9s} {'目前':>9s} {'變化':>8s}")
+    for name, base in baseline['results'].items():
+        cur = current['results'].get(name)
+        if cur is None:
+            print(f"{name:48s} {base['p50_ms']:9.3f} {'-':>9s}   (缺少)")
+            continue
+        change = cur['p50_ms'] / base['p50_ms'] - 1 if base['p50_ms'] > 0 else 0.0
+        mark = ""
+        if change > args.threshold:
+            mark = "REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            mark = "faster"
+        print(f"{name:48s} {base['p50_ms']:9.3f} {cur['p50_ms']:9.3f} {change * 100:+7.1f}% {mark}")
+    for name in current['results']:
+        if name not in baseline['results']:
+            print(f"{name:48s} {'-':>9s} {current['results'][name]['p50_ms']:9.3f}   (新增)")
+
+    print(f"\n{regressions} 項變慢超過 {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rehab 節奏遊戲效能基準測試")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="執行基準測試並存成 JSON")
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument("--size", default="1920x1080", help="內部渲染解析度，例如 1280x720")
+    run_parser.add_argument("--repeat", type=int, default=200)
+    run_parser.add_argument("--clip", action="append", default=[], help="錄好的攝影機影片（可重複指定）")
+    run_parser.add_argument("--no-pose", action="store_true", help="略過 MediaPipe 姿態偵測")
+
+    compare_parser = sub.add_parser("compare", help="與基準結果比較")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="變慢多少比例算退步（預設 0.15）")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,12 @@
 import cv2
+import time
 import mediapipe as mp
+from tracer import tracer
+from metrics import registry
+from utils import profile_gate
 
 class PoseDetector:
-    def __init__(self):
+    def __init__(self, pose_width=640, output_size=None):
         # 初始化 MediaPipe
         self.mp_drawing = mp.solutions.drawing_utils #畫圖工具
         self.mp_pose = mp.solutions.pose #人體模型藍圖
@@ -16,6 +20,12 @@ class PoseDetector:
         self.prev_right = None
         self.smooth_factor = 0.7  # 0.1(超平滑/延遲大) ~ 1.0(無平滑/反應快)
         
+        # 整條管線統一使用 BGR，只有送進 MediaPipe 的縮小副本轉成 RGB
+        self.pose_width = pose_width  # 姿態偵測輸入寬度（None = 原尺寸）
+        self.output_size = output_size  # 輸出畫面尺寸 = 內部渲染解析度（None = 攝影機原尺寸）
+        self.last_convert_time = 0    # 上次縮小 + 色彩轉換耗時 (ms)
+        self.last_inference_time = 0  # 上次 MediaPipe 推論耗時 (ms)
+        
     def _smooth_coordinate(self, prev_pos, curr_pos):
         """ 平滑化數學公式 """
         if prev_pos is None:
@@ -48,19 +58,30 @@ class PoseDetector:
         2. 左手手掌的座標 (x, y) 或 None (如果沒偵測到)
         3. 右手手掌的座標 (x, y) 或 None (如果沒偵測到)
         """
-        frame = cv2.flip(frame, 1)
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
-        results = self.pose.process(image)
-        image.flags.writeable = True
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        # 攝影機不支援內部解析度時，在這個背景執行緒縮放，主執行緒拿到的都是同一尺寸
+        if self.output_size is not None and (frame.shape[1], frame.shape[0]) != self.output_size:
+            frame = cv2.resize(frame, self.output_size, interpolation=cv2.INTER_AREA)
+        image = cv2.flip(frame, 1)
+        h, w = image.shape[:2]
+
+        # 只給姿態偵測一份縮小的 RGB 副本；landmark 是正規化座標，不受縮放影響
+        start_time = time.perf_counter()
+        if self.pose_width and w > self.pose_width:
+            pose_size = (self.pose_width, int(h * self.pose_width / w))
+            pose_input = cv2.resize(image, pose_size, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(pose_input, cv2.COLOR_BGR2RGB, dst=pose_input)
+        else:
+            pose_input = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        pose_input.flags.writeable = False
+        convert_done = time.perf_counter()
+        results = self.pose.process(pose_input)
+        self.last_convert_time = (convert_done - start_time) * 1000
+        self.last_inference_time = (time.perf_counter() - convert_done) * 1000
 
         left_hand_pos = None
         right_hand_pos = None
 
         if results.pose_landmarks:
-            h, w, c = image.shape
-
             # 左手處理
             left_hand_pos = self._process_hand(
                 results, w, h,
@@ -90,11 +111,14 @@ class PoseDetector:
 class PoseDetectorThread:
     """姿態偵測執行緒包裝器 - 在背景執行姿態偵測以提升 FPS"""
     
-    def __init__(self):
+    def __init__(self, output_size=None):
         import threading
         import time
-        self.detector = PoseDetector()
+        self.detector = PoseDetector(output_size=output_size)
         self.frame = None
+        self.frame_id = None         # 主迴圈送進來的幀 ID（trace 用）
+        self.pose_interval = 1       # 每幾個畫面做一次姿態偵測（畫質調節用）
+        self.submit_count = 0
         self.processed_image = None
         self.left_hand_pos = None
         self.right_hand_pos = None
@@ -105,12 +129,14 @@ class PoseDetectorThread:
         # 計時與追蹤
         self.result_id = 0           # 結果 ID（每次處理完 +1）
         self.last_process_time = 0   # 上次處理耗時 (ms)
-        self.process_count = 0       # 已處理幀數
-        self.total_process_time = 0  # 總處理時間
+        self.process_hist = registry.histogram("pose.process_ms", description="姿態偵測")
+        self.convert_hist = registry.histogram("pose.convert_ms", description="姿態輸入轉換")
+        self.inference_hist = registry.histogram("pose.inference_ms", description="姿態推論")
+        self.skipped_counter = registry.counter("pose.skipped", description="姿態隔幀略過")
     
     def start(self):
         import threading
-        threading.Thread(target=self._update, args=(), daemon=True).start()
+        threading.Thread(target=self._update, args=(), daemon=True, name="PoseDetector").start()
         return self
     
     def _update(self):
@@ -122,32 +148,48 @@ class PoseDetectorThread:
             
             with self.lock:
                 frame = self.frame
+                frame_id = self.frame_id
             
-            if frame is not None:
-                # 計時開始
-                start_time = time.time()
+            with profile_gate.work():
+                if frame is not None:
+                    tracer.set_frame_id(frame_id)
+                    # 計時開始
+                    start_time = time.time()
                 
-                # 執行姿態偵測 (耗時操作)
-                processed, left, right = self.detector.process_frame(frame)
+                    # 執行姿態偵測 (耗時操作)
+                    with tracer.span("pose.process", result_id=self.result_id + 1):
+                        processed, left, right = self.detector.process_frame(frame)
                 
-                # 計時結束
-                elapsed = (time.time() - start_time) * 1000
+                    # 計時結束
+                    elapsed = (time.time() - start_time) * 1000
                 
-                with self.lock:
-                    self.processed_image = processed
-                    self.left_hand_pos = left
-                    self.right_hand_pos = right
-                    self.result_id += 1
-                    self.last_process_time = elapsed
-                    self.process_count += 1
-                    self.total_process_time += elapsed
+                    with self.lock:
+                        self.processed_image = processed
+                        self.left_hand_pos = left
+                        self.right_hand_pos = right
+                        self.result_id += 1
+                        self.last_process_time = elapsed
+                    self.process_hist.observe(elapsed)
+                    self.convert_hist.observe(self.detector.last_convert_time)
+                    self.inference_hist.observe(self.detector.last_inference_time)
     
-    def submit_frame(self, frame):
-        """主執行緒：提交新畫面給背景處理"""
+    def submit_frame(self, frame, frame_id=None):
+        """主執行緒：提交新畫面給背景處理（frame_id 只用於 trace 對應）"""
         with self.lock:
+            self.submit_count += 1
+            if self.submit_count % self.pose_interval:
+                self.skipped_counter.inc()
+                return  # 隔幀模式：這一幀不送去偵測，主執行緒沿用上一個結果
             self.frame = frame
+            self.frame_id = frame_id
         self.new_frame_event.set()
     
+    def set_quality(self, pose_width=None, pose_interval=1):
+        """調整姿態偵測輸入寬度與頻率（下一次處理時生效）"""
+        with self.lock:
+            self.detector.pose_width = pose_width
+            self.pose_interval = max(1, int(pose_interval))
+    
     def get_result(self):
         """主執行緒：取得最新處理結果 (不阻塞)"""
         with self.lock:
@@ -166,13 +208,13 @@ class PoseDetectorThread:
     
     def get_stats(self):
         """取得處理統計"""
-        with self.lock:
-            avg = self.total_process_time / self.process_count if self.process_count > 0 else 0
-            return {
-                'process_count': self.process_count,
-                'avg_time_ms': avg,
-                'last_time_ms': self.last_process_time
-            }
+        return {
+            'process_count': self.process_hist.count,
+            'avg_time_ms': self.process_hist.avg,
+            'last_time_ms': self.last_process_time,
+            'avg_convert_ms': self.convert_hist.avg,
+            'avg_inference_ms': self.inference_hist.avg
+        }
     
     def stop(self):
         self.stopped = True
\ No newline at end of file
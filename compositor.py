@@ -0,0 +1,88 @@
+"""
+背景影片合成器 - 把攝影機畫面與背景影片合成到同一張畫面
+圓弧內：攝影機 + 半透明影片；圓弧外：只有影片
+"""
+
+import cv2
+import numpy as np
+from utils import ui_scale
+
+
+def copy_frame(dst, src):
+    """把畫面複製到呈現緩衝區；尺寸不同（攝影機沒給出要求的解析度）時縮放到緩衝區大小"""
+    if src.shape == dst.shape:
+        np.copyto(dst, src)
+    else:
+        cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+    return dst
+
+
+class Compositor:
+    """
+    單次合成器 - 幾何改變時才重算 alpha 圖
+    只在圓弧外接矩形 (ROI) 內做逐像素混合，ROI 外直接複製影片，輸出寫入預先配置的緩衝區
+    """
+
+    def __init__(self, width, height, video_alpha=0.3, feather=0):
+        self.video_alpha = video_alpha  # 圓弧內影片比例（0.3 = 30% 影片, 70% 攝影機）
+        self.feather = feather          # 遮罩邊緣柔化程度（高斯模糊 sigma，0 = 硬邊）
+        self.width = 0
+        self.height = 0
+        self.set_geometry(width, height)
+
+    def set_geometry(self, width, height):
+        """依畫面尺寸重算遮罩、ROI 與權重圖（尺寸不變時不做事）"""
+        if (width, height) == (self.width, self.height):
+            return
+        self.width = width
+        self.height = height
+        self.out = np.empty((height, width, 3), dtype=np.uint8)
+
+        # 遮罩半徑 = arc_radius + hitbox 容差，確保背景影片剛好在 hitbox 外圈開始
+        center = (width // 2, height)
+        arc_radius = int(width * 0.4)
+        hit_tolerance = int(80 * ui_scale(width))
+        radius = arc_radius + hit_tolerance
+
+        # 柔邊會讓遮罩往外擴散約 3 sigma，ROI 也要跟著放大
+        pad = int(np.ceil(self.feather * 3))
+        x0 = max(center[0] - radius - pad, 0)
+        x1 = min(center[0] + radius + pad, width)
+        y0 = max(center[1] - radius - pad, 0)
+        y1 = height
+        self.roi = (x0, y0, x1, y1)
+
+        # 只在 ROI 內建立單通道遮罩
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.circle(mask, (center[0] - x0, center[1] - y0), radius, 255, -1)
+        if self.feather > 0:
+            mask = cv2.GaussianBlur(mask, (0, 0), self.feather)
+
+        # 攝影機權重 = 遮罩 × (1 - 影片比例)；影片權重 = 1 - 攝影機權重
+        self.camera_weight = mask.astype(np.float32) * ((1.0 - self.video_alpha) / 255.0)
+        self.video_weight = 1.0 - self.camera_weight
+
+    def compose(self, camera, video, out=None):
+        """
+        合成一幀（camera 與 video 必須是相同尺寸的 BGR 影像）
+        out: 輸出緩衝區；None 代表使用內部緩衝區（下一次呼叫會被覆寫）
+        """
+        if out is None:
+            out = self.out
+        x0, y0, x1, y1 = self.roi
+
+        # ROI 外：整塊都是影片，直接複製
+        if y0 > 0:
+            np.copyto(out[:y0], video[:y0])
+        if x0 > 0:
+            np.copyto(out[y0:y1, :x0], video[y0:y1, :x0])
+        if x1 < self.width:
+            np.copyto(out[y0:y1, x1:], video[y0:y1, x1:])
+
+        # ROI 內：一次逐像素加權混合，直接寫進輸出緩衝區
+        cv2.blendLinear(
+            camera[y0:y1, x0:x1], video[y0:y1, x0:x1],
+            self.camera_weight, self.video_weight,
+            dst=out[y0:y1, x0:x1]
+        )
+        return out
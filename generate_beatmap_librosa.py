@@ -1,10 +1,24 @@
 """
 Beatmap Generator using Librosa
 自動分析音樂並生成節奏遊戲譜面
+用法：
+    python generate_beatmap_librosa.py                 # 分析 music/ 底下所有歌曲（未變更的歌曲會略過）
+    python generate_beatmap_librosa.py "Haruhikage.wav" --jobs 2 --threshold 1.2
+    python generate_beatmap_librosa.py --stream         # 分區塊串流分析，記憶體用量與歌曲長度無關
+    python generate_beatmap_librosa.py "Haruhikage.wav" --verify   # 比較串流與整首載入的結果
+    python generate_beatmap_librosa.py --difficulties easy normal  # 只輸出指定難度
+分析結果（拍點、強度、onset 包絡）存成 <歌名>_analysis.npz，調整難度門檻時不必重新分析
 """
 import librosa
 import numpy as np
+import soundfile as sf
 import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from new_game_logic import compile_chart
 
 # === 設定 ===
 CONFIG = {
@@ -14,6 +28,32 @@ CONFIG = {
     "threshold_multiplier": 1.1,  # 門檻倍率 (1.0 ~ 1.3)
 }
 
+# 支援的音訊副檔名
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+
+# 節拍分析（_analysis.npz 的內容）改變時加一，讓舊的分析結果失效、重新執行 librosa
+ANALYSIS_VERSION = 3
+
+# 譜面輸出（0/1 譜面、時間對照、編譯譜面）改變時加一，只重新生成譜面，沿用分析結果
+CHART_VERSION = 1
+
+# 難度 -> 門檻倍率（倍率越高，達標的拍點越少）
+# normal 沿用原本的檔名，其他難度加上 _<難度> 後綴
+DIFFICULTIES = {
+    "easy": 1.3,
+    "normal": CONFIG["threshold_multiplier"],
+    "hard": 0.9,
+}
+DEFAULT_DIFFICULTY = "normal"
+
+# 編譯譜面的區域數（與 main.py 建立 GameEngine 時的 zone_count 相同）
+CHART_ZONE_COUNT = 8
+
+# 與 librosa.onset.onset_strength / beat_track 的預設值相同，串流結果才能與整首載入一致
+N_FFT = 2048
+HOP_LENGTH = 512
+STREAM_BLOCK_FRAMES = 256  # 每個區塊的分析幀數（44.1kHz 約 3 秒）
+
 
 def load_audio(file_path):
     """載入音訊檔案"""
@@ -22,47 +62,200 @@ def load_audio(file_path):
     return librosa.load(file_path, sr=None)
 
 
-def analyze_beats(y, sr):
-    """分析節拍，回傳 BPM、拍點時間、拍點強度"""
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+def _beat_analysis(tempo, beat_frames, onset_env, sr, duration):
+    """整理 beat_track 的結果成分析 dict（拍點強度正規化到 0~1）"""
     bpm = tempo.item() if hasattr(tempo, 'item') else float(tempo)
-    
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    beat_times = librosa.frames_to_time(beat_frames, sr=sr)
+    beat_times = librosa.frames_to_time(beat_frames, sr=sr, hop_length=HOP_LENGTH)
     beat_strengths = onset_env[beat_frames]
-    
     if len(beat_strengths) > 0:
         beat_strengths = librosa.util.normalize(beat_strengths)
+    return {
+        'bpm': bpm,
+        'beat_times': beat_times,
+        'beat_strengths': beat_strengths,
+        'onset_env': onset_env,
+        'duration': duration,
+        'sr': sr,
+    }
+
+
+def _analyze(y, sr):
+    """整首載入的節拍分析，回傳分析 dict"""
+    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    return _beat_analysis(tempo, beat_frames, onset_env, sr, librosa.get_duration(y=y, sr=sr))
+
+
+def _analyze_stream(file_path, block_frames=STREAM_BLOCK_FRAMES):
+    """串流版的節拍分析，回傳分析 dict"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"找不到音樂檔案: {file_path}")
+    sr, onset_env, median_env = stream_onset_envelopes(file_path, block_frames)
+    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=median_env, sr=sr, hop_length=HOP_LENGTH)
+    # 長度直接讀檔頭（與 stream_onset_envelopes 一樣用 soundfile；librosa.get_duration 的 path 參數要 0.10 以上）
+    return _beat_analysis(tempo, beat_frames, onset_env, sr, sf.info(file_path).duration)
+
+
+def _as_tuple(analysis):
+    return analysis['bpm'], analysis['beat_times'], analysis['beat_strengths'], analysis['duration']
+
+
+def analyze_beats(y, sr):
+    """分析節拍，回傳 BPM、拍點時間、拍點強度"""
+    return _as_tuple(_analyze(y, sr))
+
+
+def _stream_blocks(file_path, block_frames):
+    """
+    以 librosa.stream 分區塊讀取（相鄰區塊重疊 n_fft - hop，分幀連續）
+    stream 的分幀不置中：第一塊前面、最後一塊後面補 n_fft // 2 個 0，等同 center=True 的補零
+    """
+    pad = np.zeros(N_FFT // 2, dtype=np.float32)
+    blocks = librosa.stream(file_path, block_length=block_frames, frame_length=N_FFT,
+                            hop_length=HOP_LENGTH, mono=True, fill_value=0)
+    prev = None
+    first = True
+    for block in blocks:
+        if prev is not None:
+            yield np.concatenate([pad, prev]) if first else prev
+            first = False
+        prev = block
+    if prev is not None:
+        yield np.concatenate(([pad] if first else []) + [prev, pad])
+
+
+def _mel_blocks(file_path, sr, block_frames):
+    """逐區塊產生 mel 功率頻譜（與 melspectrogram 預設參數相同）"""
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT)
+    for block in _stream_blocks(file_path, block_frames):
+        spec = np.abs(librosa.stft(block, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)) ** 2
+        yield mel_basis @ spec
+
+
+def stream_onset_envelopes(file_path, block_frames=STREAM_BLOCK_FRAMES):
+    """
+    串流計算 onset 強度包絡，回傳 (sr, 平均包絡, 中位數包絡)
+    平均包絡 = onset_strength 預設；中位數包絡 = beat_track 內部使用的版本
+    power_to_db 的 top_db 下限取決於整首歌的最大值，所以先掃一輪取最大值，第二輪才計算包絡
+    記憶體只有一個區塊的音訊與頻譜，外加每幀一個浮點數的包絡
+    """
+    sr = librosa.get_samplerate(file_path)
+    n_frames = 1 + sf.info(file_path).frames // HOP_LENGTH
+    
+    peak = 0.0
+    for S in _mel_blocks(file_path, sr, block_frames):
+        peak = max(peak, float(S.max()))
+    floor_db = 10.0 * np.log10(max(1e-10, peak)) - 80.0
     
-    duration = librosa.get_duration(y=y, sr=sr)
-    return bpm, beat_times, beat_strengths, duration
+    mean_parts, median_parts = [], []
+    prev = None
+    for S in _mel_blocks(file_path, sr, block_frames):
+        db = np.maximum(librosa.power_to_db(S, ref=1.0, top_db=None), floor_db)
+        if prev is not None:
+            db = np.concatenate([prev, db], axis=1)  # 接上一區塊最後一幀，差分才連續
+        diff = np.maximum(0.0, db[:, 1:] - db[:, :-1])
+        mean_parts.append(diff.mean(axis=0))
+        median_parts.append(np.median(diff, axis=0))
+        prev = db[:, -1:]
+    
+    # 與 onset_strength 相同：前面補 lag + n_fft // (2 * hop) 個 0，再裁成整首歌的幀數
+    pad = np.zeros(1 + N_FFT // (2 * HOP_LENGTH), dtype=np.float32)
+    mean_env = np.concatenate([pad] + mean_parts)[:n_frames]
+    median_env = np.concatenate([pad] + median_parts)[:n_frames]
+    return sr, mean_env, median_env
 
 
-def create_pattern(bpm, beat_times, beat_strengths, duration, threshold_multiplier):
-    """根據拍點強度生成遊戲譜面 (0/1 陣列)"""
+def analyze_beats_stream(file_path, block_frames=STREAM_BLOCK_FRAMES):
+    """analyze_beats 的串流版本：不載入整首歌，回傳值相同"""
+    return _as_tuple(_analyze_stream(file_path, block_frames))
+
+
+def verify_stream(file_path, tolerance=0.02):
+    """比較串流分析與整首載入的結果，差異都在容許範圍內回傳 True"""
+    y, sr = load_audio(file_path)
+    bpm, beat_times, beat_strengths, duration = analyze_beats(y, sr)
+    del y
+    s_bpm, s_times, s_strengths, s_duration = analyze_beats_stream(file_path)
+    
+    name = os.path.basename(file_path)
+    print(f"🔍 {name}")
+    print(f"   BPM: {bpm:.2f} / 串流 {s_bpm:.2f}")
+    print(f"   拍點數: {len(beat_times)} / 串流 {len(s_times)}")
+    print(f"   長度: {duration:.3f}s / 串流 {s_duration:.3f}s")
+    ok = abs(bpm - s_bpm) <= tolerance * bpm and len(beat_times) == len(s_times)
+    if ok and len(beat_times) > 0:
+        time_diff = float(np.max(np.abs(beat_times - s_times)))
+        strength_diff = float(np.max(np.abs(beat_strengths - s_strengths)))
+        print(f"   拍點時間最大差異: {time_diff * 1000:.1f} ms, 強度最大差異: {strength_diff:.4f}")
+        ok = time_diff <= tolerance and strength_diff <= tolerance
+    print(f"   {'✅ 一致' if ok else '❌ 超出容許範圍'}")
+    return ok
+
+
+def create_patterns(bpm, beat_times, beat_strengths, duration, multipliers):
+    """
+    一次算出多個門檻倍率的譜面
+    回傳 (patterns, hits, indices)：patterns[i] 是第 i 個倍率的 0/1 譜面，
+    hits[i, j] 表示第 j 個拍點在第 i 個倍率下是否成為音符，indices[j] 是拍點對應的譜面位置
+    """
     avg_interval = 60.0 / bpm
     total_beats = int(duration / avg_interval) + 5
-    pattern = [0] * total_beats
+    beat_times = np.asarray(beat_times, dtype=float)
+    beat_strengths = np.asarray(beat_strengths, dtype=float)
+    
+    # np.rint 與 round 相同採用銀行家捨入
+    indices = np.rint(beat_times / avg_interval).astype(int)
+    in_range = (indices >= 0) & (indices < total_beats)
+    thresholds = np.mean(beat_strengths) * np.asarray(multipliers, dtype=float)
+    hits = (beat_strengths[None, :] >= thresholds[:, None]) & in_range[None, :]
     
-    threshold = np.mean(beat_strengths) * threshold_multiplier
+    patterns = np.zeros((len(thresholds), total_beats), dtype=np.int8)
+    rows, cols = np.nonzero(hits)
+    patterns[rows, indices[cols]] = 1
+    return patterns, hits, indices
+
+
+def format_readable_lines(beat_times, beat_strengths, indices, hit_row):
+    """時間對照表：每個拍點一行，標示是否成為音符"""
     readable_lines = [
         f"{'Index':<12} | {'Time':<12} | {'Strength':<15} | {'Status'}",
         "-" * 60
     ]
-    hit_count = 0
-    
-    for t, strength in zip(beat_times, beat_strengths):
-        idx = int(round(t / avg_interval))
-        status = "   ..."
-        
-        if 0 <= idx < len(pattern) and strength >= threshold:
-            pattern[idx] = 1
-            status = "⬤ HIT"
-            hit_count += 1
-        
+    for idx, t, strength, hit in zip(indices.tolist(), beat_times.tolist(), beat_strengths.tolist(), hit_row.tolist()):
+        status = "⬤ HIT" if hit else "   ..."
         readable_lines.append(f"{idx:<12} | {t:.3f}s       | {strength:.3f}           | {status}")
-    
-    return pattern, readable_lines, hit_count
+    return readable_lines
+
+
+def create_pattern(bpm, beat_times, beat_strengths, duration, threshold_multiplier):
+    """根據拍點強度生成遊戲譜面 (0/1 陣列)"""
+    patterns, hits, indices = create_patterns(bpm, beat_times, beat_strengths, duration, [threshold_multiplier])
+    readable_lines = format_readable_lines(np.asarray(beat_times), np.asarray(beat_strengths), indices, hits[0])
+    return patterns[0].tolist(), readable_lines, int(hits[0].sum())
+
+
+def difficulty_suffix(difficulty):
+    """normal 沿用原本的檔名，其他難度加上 _<難度>"""
+    return "" if difficulty == DEFAULT_DIFFICULTY else f"_{difficulty}"
+
+
+def save_chart(hit_times, bpm, output_dir, filename_no_ext, seed):
+    """
+    儲存編譯好的譜面：每個音符的絕對打擊時間、區域、角度與種類
+    遊戲直接依音樂位置播放，不受 BPM 飄移影響
+    """
+    chart = {
+        'version': CHART_VERSION,
+        'name': filename_no_ext,
+        'bpm': round(bpm, 2),
+        'zone_count': CHART_ZONE_COUNT,
+        'seed': seed,
+        'notes': compile_chart(hit_times, zone_count=CHART_ZONE_COUNT, seed=seed)
+    }
+    chart_path = os.path.join(output_dir, f"{filename_no_ext}_chart.json")
+    with open(chart_path, "w", encoding="utf-8") as f:
+        json.dump(chart, f, ensure_ascii=False)
+    return chart_path
 
 
 def save_beatmap(pattern, readable_lines, output_dir, filename_no_ext):
@@ -80,40 +273,271 @@ def save_beatmap(pattern, readable_lines, output_dir, filename_no_ext):
     return game_path, time_path
 
 
-def generate_beatmap():
-    """主函數：生成譜面"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, CONFIG["music_folder"], CONFIG["music_filename"])
-    output_dir = os.path.join(current_dir, CONFIG["output_dir"])
-    filename_no_ext = os.path.splitext(CONFIG["music_filename"])[0]
+def file_hash(file_path, chunk_size=1 << 20):
+    """音訊檔內容的 SHA-1（改名或搬移不影響，內容改變才會重新分析）"""
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_cache_key(audio_hash, difficulties):
+    """快取 key = 音訊內容 + 各難度門檻 + 分析與譜面版本"""
+    params = json.dumps({
+        'audio': audio_hash,
+        'difficulties': difficulties,
+        'analysis_version': ANALYSIS_VERSION,
+        'chart_version': CHART_VERSION
+    }, sort_keys=True)
+    return hashlib.sha1(params.encode("utf-8")).hexdigest()
+
+
+def analysis_path(output_dir, filename_no_ext):
+    return os.path.join(output_dir, f"{filename_no_ext}_analysis.npz")
+
+
+def load_analysis(output_dir, filename_no_ext, audio_hash):
+    """讀取分析結果；檔案不存在、音訊內容或分析流程版本不同時回傳 None"""
+    path = analysis_path(output_dir, filename_no_ext)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data['audio_hash']) != audio_hash or int(data['version']) != ANALYSIS_VERSION:
+                return None
+            return {
+                'bpm': float(data['bpm']),
+                'beat_times': data['beat_times'],
+                'beat_strengths': data['beat_strengths'],
+                'onset_env': data['onset_env'],
+                'duration': float(data['duration']),
+                'sr': int(data['sr']),
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_analysis(analysis, output_dir, filename_no_ext, audio_hash):
+    """儲存分析結果（與門檻無關，換難度時直接重用）"""
+    path = analysis_path(output_dir, filename_no_ext)
+    np.savez(
+        path,
+        bpm=analysis['bpm'],
+        beat_times=analysis['beat_times'],
+        beat_strengths=analysis['beat_strengths'],
+        onset_env=analysis['onset_env'],
+        duration=analysis['duration'],
+        sr=analysis['sr'],
+        hop=HOP_LENGTH,
+        audio_hash=audio_hash,
+        version=ANALYSIS_VERSION
+    )
+    return path
+
+
+def meta_path(output_dir, filename_no_ext):
+    return os.path.join(output_dir, f"{filename_no_ext}_meta.json")
+
+
+def load_meta(output_dir, filename_no_ext):
+    """讀取歌曲的 meta（BPM、長度、快取 key），不存在時回傳 None"""
+    path = meta_path(output_dir, filename_no_ext)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_meta(meta, output_dir, filename_no_ext):
+    path = meta_path(output_dir, filename_no_ext)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def is_cached(output_dir, filename_no_ext, cache_key, difficulties):
+    """meta 的快取 key 相同且每個難度的譜面檔都在，才算已經分析過"""
+    meta = load_meta(output_dir, filename_no_ext)
+    if meta is None or meta.get('cache_key') != cache_key:
+        return False
+    expected = []
+    for difficulty in difficulties:
+        name = filename_no_ext + difficulty_suffix(difficulty)
+        expected += [f"{name}.txt", f"{name}_time.txt", f"{name}_chart.json"]
+    return all(os.path.exists(os.path.join(output_dir, name)) for name in expected)
+
+
+def process_song(file_path, output_dir, difficulties, cache_key, stream=False, audio_hash=None):
+    """分析一首歌並寫出各難度的譜面、時間對照與 meta（在子行程中執行）"""
+    filename = os.path.basename(file_path)
+    filename_no_ext = os.path.splitext(filename)[0]
+    audio_hash = audio_hash or file_hash(file_path)
     
-    print(f"🎵 分析中: {CONFIG['music_filename']} ...")
+    # 1~2. 音訊沒變就重用上次的分析結果，否則載入並分析節拍（串流模式不載入整首歌）
+    analysis = load_analysis(output_dir, filename_no_ext, audio_hash)
+    reused = analysis is not None
+    if not reused:
+        if stream:
+            analysis = _analyze_stream(file_path)
+        else:
+            y, sr = load_audio(file_path)
+            analysis = _analyze(y, sr)
+            del y
+        save_analysis(analysis, output_dir, filename_no_ext, audio_hash)
+    bpm, beat_times, beat_strengths, duration = _as_tuple(analysis)
+    if len(beat_strengths) == 0:
+        return {'name': filename_no_ext, 'status': 'no_beats'}
     
-    # 1. 載入音訊
-    y, sr = load_audio(file_path)
+    # 3. 一次生成所有難度的譜面
+    names = list(difficulties)
+    patterns, hits, indices = create_patterns(
+        bpm, beat_times, beat_strengths, duration, [difficulties[name] for name in names]
+    )
     
-    # 2. 分析節拍
-    bpm, beat_times, beat_strengths, duration = analyze_beats(y, sr)
-    print(f"BPM: {bpm:.2f}")
+    # 4. 儲存
+    hit_counts = {}
+    for row, difficulty in enumerate(names):
+        name = filename_no_ext + difficulty_suffix(difficulty)
+        # 亂數種子只由音訊內容 + 難度決定：其他難度或版本改變時，這個難度的區域分配不會跟著變
+        seed = int(hashlib.sha1(f"{audio_hash}:{difficulty}".encode("utf-8")).hexdigest()[:8], 16)
+        readable_lines = format_readable_lines(beat_times, beat_strengths, indices, hits[row])
+        save_beatmap(patterns[row].tolist(), readable_lines, output_dir, name)
+        save_chart(beat_times[hits[row]], bpm, output_dir, name, seed=seed)
+        hit_counts[difficulty] = int(hits[row].sum())
+    meta = {
+        'name': filename_no_ext,
+        'filename': filename,
+        'bpm': round(bpm, 2),
+        'duration': round(duration, 3),
+        'beat_count': len(beat_times),
+        'difficulties': {
+            difficulty: {'threshold_multiplier': difficulties[difficulty], 'hit_count': hit_counts[difficulty]}
+            for difficulty in names
+        },
+        'cache_key': cache_key
+    }
+    # 手動設定（BPM、note_speed 等）放在 <歌名>_overrides.json，由歌曲目錄疊加在 meta 上，這裡不動它
+    save_meta(meta, output_dir, filename_no_ext)
+    return {'name': filename_no_ext, 'status': 'done', 'bpm': bpm, 'beat_count': len(beat_times),
+            'hit_counts': hit_counts, 'reused': reused}
+
+
+def find_songs(music_dir):
+    """列出資料夾內所有音訊檔（檔名排序）"""
+    if not os.path.isdir(music_dir):
+        return []
+    return sorted(
+        os.path.join(music_dir, name) for name in os.listdir(music_dir)
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+
+
+def generate_all(music_dir, output_dir, difficulties=None, files=None, jobs=None, force=False, stream=False):
+    """
+    批次分析：內容與參數都沒變的歌曲直接略過，其餘平行分析
+    difficulties 為 {難度: 門檻倍率}，預設為 DIFFICULTIES
+    """
+    difficulties = dict(difficulties or DIFFICULTIES)
+    os.makedirs(output_dir, exist_ok=True)
+    if files:
+        paths = [f if os.path.isabs(f) else os.path.join(music_dir, f) for f in files]
+    else:
+        paths = find_songs(music_dir)
+    if not paths:
+        print(f"找不到音樂檔案: {music_dir}")
+        return []
     
-    if len(beat_strengths) == 0:
-        print("警告：未偵測到節拍點")
-        return
+    pending = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"❌ 找不到音樂檔案: {path}")
+            continue
+        filename_no_ext = os.path.splitext(os.path.basename(path))[0]
+        audio_hash = file_hash(path)
+        cache_key = make_cache_key(audio_hash, difficulties)
+        if not force and is_cached(output_dir, filename_no_ext, cache_key, difficulties):
+            print(f"⏭️  已是最新，略過: {filename_no_ext}")
+            continue
+        if force:
+            # --force 連分析結果一起重算
+            stale = analysis_path(output_dir, filename_no_ext)
+            if os.path.exists(stale):
+                os.remove(stale)
+        pending.append((path, cache_key, audio_hash))
     
-    # 3. 生成譜面
-    pattern, readable_lines, hit_count = create_pattern(
-        bpm, beat_times, beat_strengths, duration, CONFIG["threshold_multiplier"]
+    results = []
+    if not pending:
+        return results
+    print(f"🎵 分析 {len(pending)} 首歌曲 ...")
+    
+    def report(result):
+        results.append(result)
+        if result['status'] == 'done':
+            counts = ", ".join(f"{name} {count}" for name, count in result['hit_counts'].items())
+            source = "（重用分析結果）" if result['reused'] else ""
+            print(f"✅ {result['name']}: BPM {result['bpm']:.2f}, 總拍點 {result['beat_count']}, 音符數 {counts}{source}")
+        else:
+            print(f"⚠️  {result['name']}: 未偵測到節拍點")
+    
+    if jobs == 1 or len(pending) == 1:
+        for path, cache_key, audio_hash in pending:
+            report(process_song(path, output_dir, difficulties, cache_key, stream, audio_hash))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(process_song, path, output_dir, difficulties, cache_key, stream, audio_hash): path
+                for path, cache_key, audio_hash in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    report(future.result())
+                except Exception as e:
+                    print(f"❌ {os.path.basename(futures[future])}: {e}")
+    return results
+
+
+def generate_beatmap(filename=None):
+    """生成單首譜面（預設為 CONFIG 指定的歌曲）"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    filename = filename or CONFIG["music_filename"]
+    return generate_all(
+        os.path.join(current_dir, CONFIG["music_folder"]),
+        os.path.join(current_dir, CONFIG["output_dir"]),
+        files=[filename],
+        jobs=1
     )
+
+
+def main(argv=None):
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="分析音樂並生成節奏遊戲譜面")
+    parser.add_argument("files", nargs="*", help="要分析的檔名（預設為音樂資料夾內所有歌曲）")
+    parser.add_argument("--music-dir", default=os.path.join(current_dir, CONFIG["music_folder"]))
+    parser.add_argument("--output-dir", default=os.path.join(current_dir, CONFIG["output_dir"]))
+    parser.add_argument("--threshold", type=float, default=CONFIG["threshold_multiplier"], help="normal 難度的門檻倍率 (1.0 ~ 1.3)")
+    parser.add_argument("--difficulties", nargs="+", choices=list(DIFFICULTIES), default=list(DIFFICULTIES),
+                        help="要輸出的難度（預設全部）")
+    parser.add_argument("--jobs", type=int, default=None, help="平行行程數（預設為 CPU 核心數）")
+    parser.add_argument("--force", action="store_true", help="忽略快取，全部重新分析")
+    parser.add_argument("--stream", action="store_true", help="分區塊串流分析（長曲目省記憶體）")
+    parser.add_argument("--verify", action="store_true", help="只比較串流與整首載入的分析結果，不寫檔")
+    args = parser.parse_args(argv)
     
-    # 4. 儲存
-    game_path, time_path = save_beatmap(pattern, readable_lines, output_dir, filename_no_ext)
+    if args.verify:
+        paths = [f if os.path.isabs(f) else os.path.join(args.music_dir, f) for f in args.files] or find_songs(args.music_dir)
+        results = [verify_stream(path) for path in paths]
+        return 0 if all(results) else 1
     
-    print(f"\n✅ 譜面生成完成！")
-    print(f"   遊戲譜面: {os.path.basename(game_path)}")
-    print(f"   時間對照: {os.path.basename(time_path)}")
-    print(f"   總拍點: {len(beat_times)}, 音符數: {hit_count}")
-    print(f"⚠️  請在 main.py 設定 BPM 為: {int(round(bpm))}")
+    difficulties = dict(DIFFICULTIES, **{DEFAULT_DIFFICULTY: args.threshold})
+    difficulties = {name: difficulties[name] for name in args.difficulties}
+    generate_all(args.music_dir, args.output_dir, difficulties, files=args.files, jobs=args.jobs,
+                 force=args.force, stream=args.stream)
+    return 0
 
 
 if __name__ == "__main__":
-    generate_beatmap()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
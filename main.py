@@ -1,37 +1,109 @@
-import cv2
 import time
 import os
+import numpy as np
 from camera_sensor import PoseDetectorThread
 from new_game_logic import GameEngine
 from ui_renderer import GameUI
-from music_controller import MusicController
+from music_controller import MusicController, init_mixer
 from webcam_stream import WebcamStream
-from video_player import VideoPlayerThread
 from utils import FPSCounter, is_hand_in_box, StepProfiler
-from pygame_display import PygameDisplay
-from pygame_ui import PygameUI
+from render_thread import RenderThread
+from asset_preloader import AssetPreloader
+from sound_effects import SoundEffects
+from video_cache import VideoFrameCache
+from compositor import Compositor, copy_frame
+from tracer import tracer
+from quality_governor import QualityGovernor
+from metrics import registry, MetricsWriter, GCMonitor
+from song_catalog import SongCatalog, DIFFICULTIES, DEFAULT_DIFFICULTY
+
+
+# 內部渲染解析度：所有子系統都在這個尺寸運作，只在呈現時放大到視窗大小一次
+# 低階電腦可改成 1280x720 或 960x540
+RENDER_WIDTH, RENDER_HEIGHT = 1920, 1080
+WINDOW_WIDTH, WINDOW_HEIGHT = 1920, 1080
+
+# 步驟耗時報告另存為 JSON Lines（None 代表只印在 console）
+PROFILE_JSON_PATH = None
+
+# 配置分析模式：步驟報告附加每個步驟的記憶體配置量與 GC 統計（tracemalloc 會拖慢遊戲，平常關閉）
+PROFILE_ALLOCATIONS = False
+# 配置量是整個行程的數字；開啟後主迴圈各步驟執行時暫停背景執行緒的 CPU 工作，配置量才只屬於該步驟
+# （會改變執行緒之間的時序，耗時數字不可與一般模式比較，平常關閉）
+PROFILE_ISOLATE_THREADS = False
+
+# 背景影片幀快取：None 代表停用；預算為快取資料夾的磁碟上限
+# 快取幀寬度上限 640（每幀約 0.69 MB），8 GB 可容納約 6.6 分鐘的 30 fps 影片，超過的影片不快取
+VIDEO_CACHE_DIR = "video_cache"
+VIDEO_CACHE_BUDGET = 8 * 1024 ** 3
+VIDEO_CACHE_MAX_WIDTH = 640
+
+# Chrome / Perfetto trace 輸出路徑：None 代表停用（也可用環境變數 REHAB_TRACE 指定）
+# 啟用後按 F9 立即輸出，程式結束時也會自動輸出
+TRACE_PATH = os.environ.get("REHAB_TRACE")
+
+# 畫質調節器的目標 FPS（主迴圈幀預算）；None 代表固定最高畫質
+QUALITY_TARGET_FPS = 30
+
+# 效能指標快照（每秒一行 JSON）的輸出資料夾；None 代表停用
+TELEMETRY_DIR = "telemetry"
+
+
+def apply_quality(settings, sensor, video_thread):
+    """把畫質等級中可以即時生效的設定套用到各執行緒"""
+    sensor.set_quality(settings['pose_width'], settings['pose_interval'])
+    if video_thread:
+        video_thread.set_frame_step(settings['video_frame_step'])
 
 
 def main():
-    SONG_LIST = [
-        { "name": "Haruhikage", "filename": "Haruhikage.wav", "bpm": 97, "note_speed": 7, "folder": "music" },
-        { "name": "Zankoku na Tenshi no Te-ze", "filename": "Zankoku na Tenshi no Te-ze.wav", "bpm": 128, "note_speed": 7, "folder": "music" }
-    ]
+    if TRACE_PATH:
+        tracer.enable(TRACE_PATH)
+        print(f"Trace 記錄已啟用，輸出到: {TRACE_PATH}")
+
+    # 歌曲目錄：掃描 music/、beatmap/、video/（BPM 與譜面 / 影片是否存在都來自索引）
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    catalog = SongCatalog(current_dir).scan()
+    if len(catalog) == 0:
+        print(f"找不到任何歌曲，請把音樂檔放到 {catalog.music_dir}")
 
-    sensor = PoseDetectorThread().start()
-    FULL_WIDTH, FULL_HEIGHT = 1920, 1080
+    FULL_WIDTH, FULL_HEIGHT = RENDER_WIDTH, RENDER_HEIGHT
+    sensor = PoseDetectorThread(output_size=(FULL_WIDTH, FULL_HEIGHT)).start()
     ui = GameUI(width=FULL_WIDTH, height=FULL_HEIGHT)
-    pygame_ui = PygameUI(width=FULL_WIDTH, height=FULL_HEIGHT)  # 新增 Pygame UI
+    compositor = Compositor(FULL_WIDTH, FULL_HEIGHT, video_alpha=0.3)
+    
+    # mixer 要在 pygame.init() 之前用低延遲設定初始化
+    init_mixer()
     
-    # 使用 Pygame 顯示器（替代 OpenCV imshow）
-    display = PygameDisplay(FULL_WIDTH, FULL_HEIGHT, 'Rehab System - Rhythm Game')
+    # Pygame 顯示器與 Pygame UI 都在獨立的呈現執行緒，透過三重緩衝接收畫面
+    renderer = RenderThread(FULL_WIDTH, FULL_HEIGHT, 'Rehab System - Rhythm Game',
+                            window_size=(WINDOW_WIDTH, WINDOW_HEIGHT)).start()
     
     cap = WebcamStream(src=0, width=FULL_WIDTH, height=FULL_HEIGHT).start()
     time.sleep(1.0)
     
+    video_cache = None
+    if VIDEO_CACHE_DIR:
+        video_cache = VideoFrameCache(os.path.join(current_dir, VIDEO_CACHE_DIR), budget_bytes=VIDEO_CACHE_BUDGET,
+                                     max_width=VIDEO_CACHE_MAX_WIDTH)
+    preloader = AssetPreloader(current_dir, video_size=(FULL_WIDTH, FULL_HEIGHT), video_cache=video_cache)
+    sfx = SoundEffects(os.path.join(current_dir, "sound"))
+    gc_monitor = GCMonitor(registry).start()
+    metrics_writer = None
+    if TELEMETRY_DIR:
+        metrics_writer = MetricsWriter(registry, os.path.join(current_dir, TELEMETRY_DIR)).start()
+    
+    # 主迴圈指標
+    frame_hist = registry.histogram("main.frame_ms", description="主迴圈幀時間")
+    pose_reuse_counter = registry.counter("main.pose_reuse", description="姿態結果重複使用")
+    pose_reuse_gauge = registry.gauge("main.pose_reuse_pct", description="姿態結果重複使用率 (%)")
+    quality_gauge = registry.gauge("quality.level", description="畫質等級")
+    
     is_running = True
     bg_video_thread = None
     fps_counter = FPSCounter()
+    governor = QualityGovernor(target_fps=QUALITY_TARGET_FPS or 30, enabled=QUALITY_TARGET_FPS is not None)
+    difficulty = DEFAULT_DIFFICULTY  # 選單上的難度（跨歌曲保留，由治療師依病人調整）
 
     while is_running:
         # ==========================================
@@ -41,10 +113,30 @@ def main():
             bg_video_thread.stop()
             bg_video_thread = None 
 
+        # 畫質調節器降低了解析度：在選單開始預載之前套用，下一首歌就以新解析度執行
+        render_scale = governor.settings['render_scale']
+        render_size = (int(RENDER_WIDTH * render_scale) // 2 * 2, int(RENDER_HEIGHT * render_scale) // 2 * 2)
+        if render_size != (FULL_WIDTH, FULL_HEIGHT):
+            FULL_WIDTH, FULL_HEIGHT = render_size
+            print(f"內部渲染解析度改為 {FULL_WIDTH}x{FULL_HEIGHT}")
+            sensor.detector.output_size = render_size
+            ui = GameUI(width=FULL_WIDTH, height=FULL_HEIGHT)
+            compositor.set_geometry(FULL_WIDTH, FULL_HEIGHT)
+            renderer.set_render_size(FULL_WIDTH, FULL_HEIGHT)
+            preloader.video_size = render_size
+        governor.set_applied_render_scale(render_scale)
+
         selected_song = None
         hover_index = -1
         hover_start_time = 0
         SELECTION_TIME = 3.0
+        PAGE_TIME = 1.0  # 換頁與難度按鈕只需停留較短時間
+        page_size = GameUI.MENU_PAGE_SIZE
+        page = 0
+        page_count = catalog.page_count(page_size)
+        page_songs = catalog.page(page, page_size, difficulty)
+        # 方框順序：這一頁的歌曲 → 上一頁 / 下一頁（有多頁時）→ 難度按鈕
+        difficulty_index = len(page_songs) + (2 if page_count > 1 else 0)
         
         menu_done = False
         while not menu_done and is_running:
@@ -56,20 +148,36 @@ def main():
             sensor.submit_frame(frame)
             processed_image, left_hand_pos, right_hand_pos = sensor.get_result()
             
-            # 首次啟動時可能還沒有結果
-            if processed_image is None:
+            # 首次啟動時可能還沒有結果；切換解析度後也可能拿到舊尺寸的結果
+            if processed_image is None or processed_image.shape[1] != FULL_WIDTH:
                 continue
             
             progress = 0.0
             if hover_index != -1:
                 elapsed = time.time() - hover_start_time
-                progress = min(elapsed / SELECTION_TIME, 1.0)
-                if progress >= 1.0:
-                    selected_song = SONG_LIST[hover_index]
+                is_button = hover_index >= len(page_songs)
+                progress = min(elapsed / (PAGE_TIME if is_button else SELECTION_TIME), 1.0)
+                if progress >= 1.0 and is_button:
+                    if hover_index == difficulty_index:
+                        # 切換難度（循環）；沒有這個難度譜面的歌曲維持 normal
+                        difficulty = DIFFICULTIES[(DIFFICULTIES.index(difficulty) + 1) % len(DIFFICULTIES)]
+                    else:
+                        # 上一頁 / 下一頁（循環），繼續停留會再換一頁
+                        step = -1 if hover_index == len(page_songs) else 1
+                        page = (page + step) % page_count
+                    page_songs = catalog.page(page, page_size, difficulty)
+                    difficulty_index = len(page_songs) + (2 if page_count > 1 else 0)
+                    hover_index = -1
+                    progress = 0.0
+                elif progress >= 1.0:
+                    selected_song = page_songs[hover_index]
                     menu_done = True 
             
             fps = fps_counter.update()
-            box_regions = ui.draw_menu(processed_image, SONG_LIST, hover_index, progress, fps)
+            # 畫在呈現緩衝區上，不去修改姿態執行緒的結果
+            menu_image = renderer.back_buffer()
+            copy_frame(menu_image, processed_image)
+            box_regions = ui.draw_menu(menu_image, page_songs, hover_index, progress, fps, page, page_count, difficulty)
             
             current_hover = -1
             for i, box in enumerate(box_regions):
@@ -80,35 +188,35 @@ def main():
                 if current_hover != hover_index:
                     hover_index = current_hover
                     hover_start_time = time.time()
+                    # hover 計時期間在背景預載這首歌的資源（換頁與難度按鈕不需要）
+                    if hover_index < len(page_songs):
+                        preloader.request(page_songs[hover_index])
+                    else:
+                        preloader.cancel()
             else:
+                if hover_index != -1:
+                    preloader.cancel()
                 hover_index = -1
                 hover_start_time = 0
             
-            display.show(processed_image)
-            if display.process_events(): is_running = False
+            renderer.submit(menu_image)
+            if renderer.process_events(): is_running = False
         
         if not is_running: break
 
         # ==========================================
         # Phase 2: Game (遊戲)
         # ==========================================
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        if selected_song['folder']:
-            music_path = os.path.join(current_dir, selected_song['folder'], selected_song['filename'])
-        else:
-            music_path = os.path.join(current_dir, selected_song['filename'])
-        
-        filename_no_ext = os.path.splitext(selected_song['filename'])[0]
-        video_filename = f"{filename_no_ext}.mp4"
-        video_path = os.path.join(current_dir, "video", video_filename)
+        # 取得預載好的資源（若預載尚未完成會在這裡等待剩餘部分）
+        assets = preloader.take(selected_song)
         
-        if os.path.exists(video_path):
-            print(f"啟動背景影片執行緒: {video_filename}")
-            bg_video_thread = VideoPlayerThread(video_path).start()
-        else:
-            bg_video_thread = None
+        bg_video_thread = assets['video']
+        if bg_video_thread:
+            print(f"啟動背景影片執行緒: {os.path.basename(bg_video_thread.video_path)}")
+            bg_video_thread.start()
+        apply_quality(governor.settings, sensor, bg_video_thread)
+        governor.reset_samples()
         
-        beatmap_name = filename_no_ext + ".txt"
         bpm = selected_song['bpm']
         note_speed = selected_song['note_speed'] 
         
@@ -119,13 +227,17 @@ def main():
             zone_count=8,
             note_speed=note_speed,
             notes_per_beat=1,
-            beatmap_file=beatmap_name 
+            beatmap_file=assets['beatmap_name'],
+            rhythm_pattern=assets['rhythm_pattern'],
+            chart=assets['chart']
         )
-        music = MusicController(bpm=bpm, music_file=music_path)
+        music = MusicController(bpm=bpm, music_file=assets['music_path'], song_duration=assets['song_duration'])
         music.start()
         game_done = False
         game_start_time = time.time()
-        profiler = StepProfiler(enabled=True, print_interval=60)  # 每 60 幀輸出一次
+        profiler = StepProfiler(enabled=True, print_interval=60, json_path=PROFILE_JSON_PATH,
+                                track_allocations=PROFILE_ALLOCATIONS,
+                                isolate_threads=PROFILE_ISOLATE_THREADS)  # 每 60 幀輸出一次
         
         # 平行處理追蹤
         last_pose_id = -1
@@ -140,6 +252,8 @@ def main():
             current_time = time.time()
             delta_time = current_time - last_frame_time
             last_frame_time = current_time
+            frame_id = profiler.total_frames
+            tracer.set_frame_id(frame_id)
             
             profiler.start("攝影機讀取")
             ret, frame = cap.read()
@@ -150,39 +264,39 @@ def main():
                 continue
             
             profiler.start("姿態偵測")
-            sensor.submit_frame(frame)
+            sensor.submit_frame(frame, frame_id)
             processed_image, left_hand_pos, right_hand_pos, pose_id, pose_time = sensor.get_result_with_stats()
             profiler.end()
             
             # 追蹤重複使用
             if pose_id == last_pose_id:
                 pose_reuse_count += 1
+                pose_reuse_counter.inc()
+                tracer.instant("pose.reuse", pose_id=pose_id)
             last_pose_id = pose_id
             total_frames += 1
+            pose_reuse_gauge.set(pose_reuse_count / total_frames * 100)
+            frame_hist.observe(delta_time * 1000)
             
-            if processed_image is None:
+            if processed_image is None or processed_image.shape[1] != FULL_WIDTH:
                 continue
             
             profiler.start("影片合成")
-            if bg_video_thread:
-                bg_frame = bg_video_thread.read()
+            if bg_video_thread and governor.settings['video_blend']:
+                # 依音樂時鐘挑選對應的幀（影片執行緒已縮放到畫面尺寸）
+                bg_frame = bg_video_thread.read(music.get_position())
                 if bg_frame is not None:
-                    if bg_frame.shape[:2] != (FULL_HEIGHT, FULL_WIDTH):
-                        bg_frame = cv2.resize(bg_frame, (FULL_WIDTH, FULL_HEIGHT))
-                    
-                    # 方案 3：圓圈內也加入半透明影片
-                    alpha = 0.3  # 30% 影片, 70% 攝影機
-                    blended_inside = cv2.addWeighted(processed_image, 1.0 - alpha, bg_frame, alpha, 0)
-                    
-                    fg = cv2.bitwise_and(blended_inside, ui.mask)
-                    bg = cv2.bitwise_and(bg_frame, ui.mask_inv)
-                    processed_image = cv2.add(fg, bg)
+                    # 方案 3：圓圈內也加入半透明影片（30% 影片, 70% 攝影機）
+                    # 直接合成到呈現緩衝區，交給呈現執行緒時不需再複製
+                    processed_image = compositor.compose(processed_image, bg_frame, out=renderer.back_buffer())
             profiler.end()
 
             profiler.start("遊戲邏輯")
             # 時間驅動：傳入 delta_time
             logic.update_game_state(left_hand_pos, delta_time, music_controller=music)
             logic.update_game_state(right_hand_pos, delta_time, music_controller=music)
+            for event in logic.pop_events():
+                sfx.play(event)
             profiler.end()
             
             if (time.time() - game_start_time > 2.0) and (not music.is_music_playing()):
@@ -202,42 +316,32 @@ def main():
             profiler.end()
             
             profiler.start("畫面顯示")
-            # 新流程：先 blit 基底畫面，再用 Pygame 繪製 UI
-            display.blit_frame(processed_image)
-            pygame_ui.draw_game_ui(
-                display.get_screen(), arc_info, notes_data, score, accuracy,
-                combo, selected_song['name'], fps, time_progress
-            )
-            display.flip()
-            if display.process_events(): is_running = False
+            # 交給呈現執行緒：它會 blit 基底畫面、用 Pygame 繪製 UI 並 flip
+            renderer.submit(processed_image, {
+                'arc_info': arc_info,
+                'notes_data': notes_data,
+                'score': score,
+                'accuracy': accuracy,
+                'combo': combo,
+                'song_name': selected_song['name'],
+                'fps': fps,
+                'time_progress': time_progress,
+                'text_outline': governor.settings['text_outline']
+            }, frame_id=frame_id)
+            if renderer.process_events(): is_running = False
             profiler.end()
             
-            # 每 60 幀輸出平行處理統計
+            # 每 60 幀輸出一次效能指標（各子系統都登錄在同一個 registry）
             if profiler.frame_count == 0 and total_frames > 0:
-                print("\n" + "="*50)
-                print("🔄 平行處理統計")
-                print("="*50)
-                
-                # 攝影機統計
-                cam_stats = cap.get_stats()
-                print(f"攝影機執行緒: 讀取 {cam_stats['read_count']} 幀, 平均 {cam_stats['avg_time_ms']:.1f} ms/幀")
-                
-                # 姿態偵測統計
-                pose_stats = sensor.get_stats()
-                print(f"姿態偵測執行緒: 處理 {pose_stats['process_count']} 幀, 平均 {pose_stats['avg_time_ms']:.1f} ms/幀")
-                
-                # 影片統計
-                if bg_video_thread:
-                    vid_stats = bg_video_thread.get_stats()
-                    print(f"影片播放執行緒: 讀取 {vid_stats['read_count']} 幀, 平均 {vid_stats['avg_time_ms']:.1f} ms/幀")
-                
-                # 重複使用統計
-                reuse_rate = (pose_reuse_count / total_frames * 100) if total_frames > 0 else 0
-                print(f"\n姿態結果重複使用: {pose_reuse_count}/{total_frames} 次 ({reuse_rate:.1f}%)")
-                print("="*50)
+                registry.print_summary()
             
             profiler.frame_done()
             
+            # 依這一幀的耗時調整畫質（等級改變時立即套用可即時生效的設定）
+            if governor.update(delta_time * 1000):
+                apply_quality(governor.settings, sensor, bg_video_thread)
+                quality_gauge.set(governor.level)
+            
         music.stop()
         if bg_video_thread:
             bg_video_thread.stop()
@@ -261,7 +365,7 @@ def main():
             sensor.submit_frame(frame)
             processed_image, left_hand_pos, right_hand_pos = sensor.get_result()
             
-            if processed_image is None:
+            if processed_image is None or processed_image.shape[1] != FULL_WIDTH:
                 continue
             
             progress = 0.0
@@ -271,20 +375,25 @@ def main():
                 if progress >= 1.0: result_done = True 
             
             fps = fps_counter.update()
-            btn_rect = ui.draw_result_panel(processed_image, final_stats, progress, fps)
+            result_image = renderer.back_buffer()
+            copy_frame(result_image, processed_image)
+            btn_rect = ui.draw_result_panel(result_image, final_stats, progress, fps)
             
             if is_hand_in_box(left_hand_pos, btn_rect) or is_hand_in_box(right_hand_pos, btn_rect):
                 if not is_hovering_btn: is_hovering_btn = True; hover_start_time = time.time()
             else:
                 is_hovering_btn = False; hover_start_time = 0
             
-            display.show(processed_image)
-            if display.process_events(): is_running = False
+            renderer.submit(result_image)
+            if renderer.process_events(): is_running = False
                 
+    preloader.cancel()
     sensor.stop()
     cap.stop()
     if bg_video_thread: bg_video_thread.stop()
-    display.close()
+    renderer.stop()
+    if metrics_writer: metrics_writer.stop()
+    gc_monitor.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
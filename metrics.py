@@ -0,0 +1,250 @@
+"""
+效能指標登錄 - 各子系統共用的 counter / gauge / 固定區間 histogram（皆為執行緒安全）
+MetricsWriter 在背景每秒把快照附加到 telemetry/ 下每個 session 一個 JSON Lines 檔，事後可跨場地、跨日期比較
+"""
+
+import gc
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+
+
+# 毫秒耗時用的預設區間上界（最後一格為 +inf）
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 16, 20, 33, 50, 100, 250)
+
+# GC 暫停通常很短，較細的區間
+GC_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50)
+
+# 單一寫入者的指標不需要鎖（例如只在 GC 回呼中更新的指標，回呼執行時持有 GIL）
+_NO_LOCK = nullcontext()
+
+
+class Counter:
+    """只增不減的計數器（locked=False 代表只有單一寫入者，不加鎖）"""
+
+    def __init__(self, name, description="", locked=True):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock() if locked else _NO_LOCK
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """目前值（可任意設定）"""
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value  # 單一屬性賦值，不需要鎖
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """固定區間 histogram - 記錄次數、總和、最大值與各區間次數（locked=False 代表只有單一寫入者）"""
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS_MS, description="", locked=True):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock() if locked else _NO_LOCK
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def snapshot(self):
+        # 鎖內只複製純量，dict / list 在鎖外建立：配置記憶體可能觸發 GC，不能在持有鎖時發生
+        # 各區間次數在鎖外讀取，可能比 count 多算幾筆同時寫入的樣本
+        with self.lock:
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            'count': count,
+            'sum': total,
+            'max': maximum,
+            'buckets': list(self.buckets),
+            'counts': list(self.counts)
+        }
+
+
+class MetricsRegistry:
+    """指標登錄表 - 以名稱取得（或建立）指標，同名指標在各執行緒 / 實例間共用"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def _get(self, cls, name, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, **kwargs)
+            elif not isinstance(metric, cls):
+                raise TypeError(f"指標 {name} 已登錄為 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name, description="", locked=True):
+        return self._get(Counter, name, description=description, locked=locked)
+
+    def gauge(self, name, description=""):
+        return self._get(Gauge, name, description=description)
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS_MS, description="", locked=True):
+        return self._get(Histogram, name, buckets=buckets, description=description, locked=locked)
+
+    def snapshot(self):
+        """回傳 {time, elapsed, counters, gauges, histograms}"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        now = time.time()
+        result = {'time': now, 'elapsed': now - self.start_time, 'counters': {}, 'gauges': {}, 'histograms': {}}
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                result['counters'][metric.name] = metric.snapshot()
+            elif isinstance(metric, Gauge):
+                result['gauges'][metric.name] = metric.snapshot()
+            else:
+                result['histograms'][metric.name] = metric.snapshot()
+        return result
+
+    def print_summary(self):
+        """在 console 輸出所有指標（名稱排序）"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        print("\n" + "="*50)
+        print("📊 效能指標")
+        print("="*50)
+        for metric in metrics:
+            label = metric.description or metric.name
+            if isinstance(metric, Histogram):
+                print(f"{label}: {metric.count} 次, 平均 {metric.avg:.1f} ms, 最大 {metric.max:.1f} ms")
+            elif isinstance(metric, Counter):
+                print(f"{label}: {metric.value}")
+            else:
+                print(f"{label}: {metric.value:.1f}")
+        print("="*50)
+
+
+class MetricsWriter:
+    """背景寫入器 - 每 interval 秒把登錄表快照附加成一行 JSON"""
+
+    def __init__(self, registry, directory="telemetry", interval=1.0):
+        self.registry = registry
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        session = time.strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(directory, f"session_{session}.jsonl")
+        self.stopped = threading.Event()
+        self.thread = None
+        self.write_count = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, args=(), daemon=True, name="MetricsWriter")
+        self.thread.start()
+        print(f"效能指標寫入: {self.path}")
+        return self
+
+    def _run(self):
+        # utils 也 import 這個模組，閘門在執行時才取得
+        from utils import profile_gate
+        with open(self.path, "a", encoding="utf-8") as f:
+            while not self.stopped.wait(self.interval):
+                with profile_gate.work():
+                    self._write(f)
+            self._write(f)  # 結束前再寫一次最終狀態
+
+    def _write(self, f):
+        f.write(json.dumps(self.registry.snapshot(), ensure_ascii=False) + "\n")
+        f.flush()
+        self.write_count += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+
+# 各執行緒觸發的 GC：{thread ident: [次數, 暫停 ms]}（只在 GC 回呼中寫入）
+# 回收由配置觸發，觸發的執行緒就是造成這次回收的執行緒，StepProfiler 以此把 GC 歸給步驟
+gc_thread_stats = {}
+
+
+def gc_thread_totals(ident=None):
+    """回傳某個執行緒（預設為目前執行緒）累計觸發的 (GC 次數, 暫停 ms)"""
+    stats = gc_thread_stats.get(threading.get_ident() if ident is None else ident)
+    return (stats[0], stats[1]) if stats is not None else (0, 0.0)
+
+
+def gc_pause_histogram(registry):
+    """GC 暫停 histogram（無鎖；GCMonitor 是唯一寫入者，其他地方只讀取）"""
+    return registry.histogram("gc.pause_ms", GC_BUCKETS_MS, description="GC 暫停", locked=False)
+
+
+class GCMonitor:
+    """以 gc.callbacks 記錄每次垃圾回收的暫停時間與各世代次數"""
+
+    def __init__(self, registry):
+        # 這些指標只在回呼中更新（單一寫入者），不加鎖：
+        # GC 可能在任何執行緒持有鎖時觸發（包括正在讀取這些指標的執行緒），回呼裡取鎖會自己鎖死
+        self.pause_hist = gc_pause_histogram(registry)
+        self.generation_counters = [
+            registry.counter(f"gc.gen{generation}", description=f"GC 第 {generation} 代回收", locked=False)
+            for generation in range(3)
+        ]
+        self.start_time = None
+
+    def _callback(self, phase, info):
+        # 回收期間持有 GIL，start / stop 一定成對且不會交錯
+        if phase == "start":
+            self.start_time = time.perf_counter()
+        elif self.start_time is not None:
+            pause_ms = (time.perf_counter() - self.start_time) * 1000
+            self.pause_hist.observe(pause_ms)
+            self.generation_counters[info['generation']].inc()
+            self.start_time = None
+            ident = threading.get_ident()
+            stats = gc_thread_stats.get(ident)
+            if stats is None:
+                stats = gc_thread_stats[ident] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += pause_ms
+
+    def start(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def stop(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+
+# 全域共用的登錄表（各子系統直接 import 使用）
+registry = MetricsRegistry()
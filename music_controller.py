@@ -1,10 +1,24 @@
 import pygame
 import time
 
-class MusicController:
-    def __init__(self, bpm=120, music_file=None):
+# 低延遲 mixer 設定（背景音樂與打擊音效共用）
+MIXER_FREQUENCY = 44100
+MIXER_SIZE = -16
+MIXER_CHANNELS = 2
+MIXER_BUFFER = 512  # 越小延遲越低，太小會爆音
+
+
+def init_mixer():
+    """用低延遲設定初始化 mixer（需在 pygame.init() 之前呼叫才會生效）"""
+    if not pygame.mixer.get_init():
+        pygame.mixer.pre_init(MIXER_FREQUENCY, MIXER_SIZE, MIXER_CHANNELS, MIXER_BUFFER)
         pygame.mixer.init()
 
+
+class MusicController:
+    def __init__(self, bpm=120, music_file=None, song_duration=None):
+        init_mixer()
+
         self.bpm = bpm
         self.beat_interval = 60.0 / bpm
         self.music_file = music_file
@@ -16,10 +30,14 @@ class MusicController:
         if music_file:
             try:
                 pygame.mixer.music.load(music_file)
-                # 取得歌曲長度
-                sound = pygame.mixer.Sound(music_file)
-                self.song_duration = sound.get_length()
-                del sound  # 釋放記憶體
+                if song_duration is not None:
+                    # 長度已由 AssetPreloader 在背景取得，不需再解碼一次
+                    self.song_duration = song_duration
+                else:
+                    # 取得歌曲長度
+                    sound = pygame.mixer.Sound(music_file)
+                    self.song_duration = sound.get_length()
+                    del sound  # 釋放記憶體
                 print(f"音樂載入成功: {music_file} (長度: {self.song_duration:.1f}秒)")
             except Exception as e:
                 print(f"音樂載入失敗: {e}")
@@ -60,6 +78,17 @@ class MusicController:
         elapsed_time = time.time() - self.start_time
         return elapsed_time / self.beat_interval
 
+    def get_position(self):
+        """回傳音樂播放位置（秒），作為背景影片等的同步時鐘"""
+        if not self.is_playing or self.start_time is None:
+            return 0.0
+        if self.music_file:
+            # get_pos() 以實際送進混音器的音訊為準，長時間播放也不會和音樂漂移
+            pos_ms = pygame.mixer.music.get_pos()
+            if pos_ms >= 0:
+                return pos_ms / 1000.0
+        return time.time() - self.start_time
+
     def get_progress(self):
         """回傳歌曲播放進度 (0.0 ~ 1.0)"""
         if not self.is_playing or self.start_time is None:
@@ -2,9 +2,95 @@ import math
 import random
 import os
 import ast
+import json
+from utils import ui_scale
+
+
+# === 音符配置規則（遊戲隨機出題與譜面產生器共用） ===
+# rng 可以是 random 模組本身或 random.Random(seed)
+
+def choose_zones(rng, zone_count, count, last_zones):
+    """挑選 count 個區域：與上一次出題的區域至少相隔 2 格，不夠時不限制"""
+    all_zones = list(range(zone_count))
+    available_zones = [
+        z for z in all_zones
+        if all(abs(z - used) >= 2 for used in last_zones)
+    ]
+    if len(available_zones) < count:
+        available_zones = all_zones
+    return rng.sample(available_zones, min(count, len(available_zones)))
+
+
+def choose_angle(rng, zone, zone_count):
+    """區域內的隨機角度（兩側各留 10 度）"""
+    zone_angle_width = 180 / zone_count
+    start_angle = 180 - (zone * zone_angle_width)
+    end_angle = 180 - ((zone + 1) * zone_angle_width)
+    return rng.uniform(end_angle + 10, start_angle - 10)
+
+
+def choose_note_type(rng, level):
+    """音符種類：level >= 1 時 10% 為 bonus"""
+    if level >= 1 and rng.random() >= 0.90:
+        return 'bonus'
+    return 'normal'
+
+
+def compile_chart(hit_times, zone_count=8, notes_per_beat=1, level=1, seed=0):
+    """
+    把打擊時間（秒）編譯成譜面：每個音符預先決定區域、角度與種類
+    使用固定種子，同一首歌每次產生的譜面都相同
+    """
+    rng = random.Random(seed)
+    notes = []
+    last_zones = []
+    for t in hit_times:
+        zones = choose_zones(rng, zone_count, notes_per_beat, last_zones)
+        for zone in zones:
+            notes.append({
+                'time': round(float(t), 4),
+                'zone': zone,
+                'angle': round(choose_angle(rng, zone, zone_count), 3),
+                'type': choose_note_type(rng, level),
+            })
+        last_zones = zones
+    return notes
+
+
+def load_chart_from_file(relative_path):
+    """讀取編譯好的譜面 JSON（路徑相對於專案資料夾），不存在或格式錯誤時回傳 None"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(current_dir, relative_path)
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            chart = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not chart.get('notes'):
+        return None
+    chart['notes'].sort(key=lambda note: note['time'])
+    return chart
+
+
+def load_beatmap_from_file(relative_path):
+    """讀取 0/1 譜面檔案（路徑相對於專案資料夾），失敗時回傳空列表"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(current_dir, relative_path)
+    if not os.path.exists(file_path):
+        return []
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+            pattern = ast.literal_eval(content)
+            return pattern
+    except Exception:
+        return []
+
 
 class GameEngine:
-    def __init__(self, width, height, arc_radius=350, zone_count=4, note_speed=3, level=1, notes_per_beat=1, beatmap_file=None):
+    def __init__(self, width, height, arc_radius=350, zone_count=4, note_speed=3, level=1, notes_per_beat=1, beatmap_file=None, rhythm_pattern=None, chart=None):
         self.width = width
         self.height = height
         self.score = 0
@@ -18,7 +104,10 @@ class GameEngine:
         self.last_spawned_beat = -1
 
         # === 譜面讀取 ===
-        if beatmap_file:
+        if rhythm_pattern is not None:
+            # 已由 AssetPreloader 預先解析
+            self.rhythm_pattern = rhythm_pattern
+        elif beatmap_file:
             beatmap_path = os.path.join("beatmap", beatmap_file)
             self.rhythm_pattern = self.load_beatmap_from_file(beatmap_path)
         elif self.level == 1:
@@ -35,12 +124,22 @@ class GameEngine:
 
         self.pattern_length = len(self.rhythm_pattern)
 
+        # === 編譯好的譜面（絕對時間）：有的話依音樂位置逐一出題，不再隨機 ===
+        self.chart_notes = None
+        self.chart_index = 0
+        if chart is not None:
+            self.chart_notes = chart['notes']
+            zone_count = chart.get('zone_count', zone_count)
+
         # === 幾何與判定參數 (還原回原本的設定) ===
         self.total_notes = 0        
         self.hit_notes = 0          
         self.miss_notes = 0         
         self.ARC_CENTER = (width // 2, height) 
         
+        # 幾何以 1920 寬為基準定義，依內部解析度等比例縮放，判定不受解析度影響
+        self.scale = ui_scale(width)
+        
         # 使用傳入的半徑 (通常是 width * 0.4)
         self.ARC_RADIUS = arc_radius          
         
@@ -48,53 +147,33 @@ class GameEngine:
         self.ZONE_ANGLE_WIDTH = 180 / zone_count 
         
         # 時間驅動：速度改成「像素/秒」
-        # note_speed 參數原本是每幀移動的像素，乘以 30 轉換成每秒
-        self.NOTE_SPEED_PER_SEC = note_speed * 30          
+        # note_speed 參數原本是每幀移動的像素（1920 寬基準），乘以 30 轉換成每秒
+        self.NOTE_SPEED_PER_SEC = note_speed * 30 * self.scale
         
-        # 還原：原本較寬鬆的判定值
-        self.HIT_THRESHOLD = 70               
-        self.LINE_HIT_TOLERANCE = 80          
-        self.NOTE_RADIUS = 30                 
+        # 還原：原本較寬鬆的判定值（1920 寬基準）
+        self.HIT_THRESHOLD = 70 * self.scale
+        self.LINE_HIT_TOLERANCE = 80 * self.scale
+        self.NOTE_RADIUS = max(1, round(30 * self.scale))
+        self.NOTE_START_RADIUS = 50 * self.scale  # 音符從圓心往外出發的起始半徑
         
         self.last_hit_note_id = -1
         self.next_note_id = 0 
         self.last_spawn_zones = []  
+        
+        # 打擊事件佇列（'hit' / 'bonus' / 'miss'），由主迴圈取出觸發音效
+        self.events = []
 
     def load_beatmap_from_file(self, relative_path):
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(current_dir, relative_path)
-        if not os.path.exists(file_path):
-            return []
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                pattern = ast.literal_eval(content)
-                return pattern
-        except Exception:
-            return []
+        return load_beatmap_from_file(relative_path)
 
     def _get_available_zones(self, count):
-        all_zones = list(range(self.ZONE_COUNT))
-        available_zones = [
-            z for z in all_zones 
-            if all(abs(z - used) >= 2 for used in self.last_spawn_zones)
-        ]
-        if len(available_zones) < count:
-            self.last_spawn_zones = []
-            available_zones = all_zones
-        return random.sample(available_zones, min(count, len(available_zones)))
-
-    def _spawn_note(self, zone=None):
+        return choose_zones(random, self.ZONE_COUNT, count, self.last_spawn_zones)
+
+    def _spawn_note(self, zone=None, angle=None, note_type=None, initial_radius=None):
         if zone is None: zone = random.randint(0, self.ZONE_COUNT - 1)
-        start_angle = 180 - (zone * self.ZONE_ANGLE_WIDTH)
-        end_angle = 180 - ((zone + 1) * self.ZONE_ANGLE_WIDTH)
-        angle = random.uniform(end_angle + 10, start_angle - 10)
-        initial_radius = 50 
-        note_type = 'normal'
-        if self.level >= 1: 
-            rand = random.random()
-            if rand < 0.90: note_type = 'normal'
-            else: note_type = 'bonus'
+        if angle is None: angle = choose_angle(random, zone, self.ZONE_COUNT)
+        if note_type is None: note_type = choose_note_type(random, self.level)
+        if initial_radius is None: initial_radius = self.NOTE_START_RADIUS
         self.notes.append({
             'id': self.next_note_id,
             'zone_index': zone,
@@ -122,11 +201,28 @@ class GameEngine:
                     note['status'] = 'miss'
                     self.miss_notes += 1
                     self.combo = 0 
+                    self.events.append('miss')
                 notes_to_remove.append(note)
         for note in notes_to_remove:
             if note in self.notes:
                 self.notes.remove(note)
 
+    def _spawn_chart_notes(self, position):
+        """
+        譜面模式：音符在 打擊時間 - 飛行時間 出發，依音樂位置往前推進指標
+        出發時間已經過去的音符（掉幀或剛開始）直接放在它此刻應在的半徑，與音樂保持同步
+        """
+        travel_time = (self.ARC_RADIUS - self.NOTE_START_RADIUS) / self.NOTE_SPEED_PER_SEC
+        notes = self.chart_notes
+        while self.chart_index < len(notes):
+            note = notes[self.chart_index]
+            late = position - (note['time'] - travel_time)
+            if late < 0:
+                break
+            self.chart_index += 1
+            self._spawn_note(note['zone'], note['angle'], note.get('type', 'normal'),
+                             self.NOTE_START_RADIUS + late * self.NOTE_SPEED_PER_SEC)
+
     def get_note_position(self, note):
         rad_angle = math.radians(note['angle'])
         x = int(self.ARC_CENTER[0] + note['current_radius'] * math.cos(rad_angle))
@@ -137,9 +233,10 @@ class GameEngine:
         """
         delta_time: 這一幀經過的時間（秒）
         """
-        if music_controller is not None:
+        # 譜面模式在 _update_notes 之後出題（見 _spawn_chart_notes）
+        if music_controller is not None and self.chart_notes is None:
             current_beat = music_controller.get_current_beat_float()
-            dist = self.ARC_RADIUS - 50
+            dist = self.ARC_RADIUS - self.NOTE_START_RADIUS
             
             # 時間驅動：用實際速度計算到達時間，不再依賴 FPS
             sec_to_hit = dist / self.NOTE_SPEED_PER_SEC
@@ -158,7 +255,7 @@ class GameEngine:
                     for zone in zones: self._spawn_note(zone)
                     self.last_spawn_zones = zones
                 self.last_spawned_beat = target_beat
-        else:
+        elif music_controller is None:
             # 沒有音樂時，用時間計時器
             self.spawn_timer += delta_time
             if self.spawn_timer >= 2.0:  # 每 2 秒出一次
@@ -168,6 +265,8 @@ class GameEngine:
                 self.spawn_timer = 0
 
         self._update_notes(delta_time)
+        if music_controller is not None and self.chart_notes is not None:
+            self._spawn_chart_notes(music_controller.get_position())
         
         if hand_pos is None:
             self.last_hit_note_id = -1
@@ -193,6 +292,13 @@ class GameEngine:
                     self.combo += 1
                     if self.combo > self.max_combo: self.max_combo = self.combo
                     self.last_hit_note_id = note['id']
+                    self.events.append('bonus' if note_type == 'bonus' else 'hit')
+
+    def pop_events(self):
+        """取出並清空這一幀累積的打擊事件"""
+        events = self.events
+        self.events = []
+        return events
 
     def get_notes_for_drawing(self):
         drawing_data = []
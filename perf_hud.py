@@ -0,0 +1,116 @@
+"""
+效能 HUD - 在畫面左上角顯示滾動曲線（幀時間、姿態延遲、姿態重複使用率、攝影機 / 影片讀取、GC 暫停）
+全螢幕時看不到 console，現場人員按 F3 就能判斷是哪個環節變慢
+資料來自 metrics registry，每 refresh_interval 秒取樣並重畫到快取 surface，其餘幀只做一次 blit
+"""
+
+import time
+from collections import deque
+import pygame
+from metrics import registry
+from utils import ui_scale
+
+
+# (標籤, 指標名稱, 取樣方式, 曲線上限, 單位)
+# hist_avg：區間內平均值；hist_sum：區間內總和；gauge：目前值
+HUD_SERIES = [
+    ("frame", "main.frame_ms", 'hist_avg', 66.0, "ms"),
+    ("pose", "pose.process_ms", 'hist_avg', 66.0, "ms"),
+    ("pose reuse", "main.pose_reuse_pct", 'gauge', 100.0, "%"),
+    ("camera", "camera.read_ms", 'hist_avg', 50.0, "ms"),
+    ("video", "video.read_ms", 'hist_avg', 50.0, "ms"),
+    ("gc pause", "gc.pause_ms", 'hist_sum', 20.0, "ms"),
+]
+
+
+class PerfHud:
+    """效能 HUD - 快取 surface，取樣時才重畫"""
+
+    COLOR_BG = (15, 15, 25)
+    COLOR_GRID = (60, 60, 80)
+    COLOR_LINE = (0, 255, 120)
+    COLOR_WARN = (255, 80, 80)
+    COLOR_TEXT = (230, 230, 230)
+
+    def __init__(self, width, height, refresh_interval=0.25, history=120, budget_ms=33.3):
+        self.scale = ui_scale(width)
+        self.refresh_interval = refresh_interval
+        self.budget_ms = budget_ms  # 幀時間曲線上的預算線
+        self.history = {name: deque(maxlen=history) for _, name, _, _, _ in HUD_SERIES}
+        self.last_totals = {}
+        self.last_refresh = 0.0
+
+        self.panel_w = self._px(360)
+        self.graph_h = self._px(40)
+        self.row_h = self.graph_h + self._px(24)
+        self.margin = self._px(10)
+        self.position = (self._px(20), self._px(120))
+
+        pygame.font.init()
+        self.font = pygame.font.SysFont('Consolas', max(10, self._px(18)))
+        self.surface = pygame.Surface(
+            (self.panel_w, self.row_h * len(HUD_SERIES) + self.margin * 2)
+        ).convert()
+        self.surface.set_alpha(210)
+
+    def _px(self, value):
+        return max(1, int(round(value * self.scale)))
+
+    def _sample(self):
+        """從 registry 取一個樣本加入各曲線"""
+        for _, name, kind, _, _ in HUD_SERIES:
+            metric = registry.metrics.get(name)
+            if metric is None:
+                value = 0.0
+            elif kind == 'gauge':
+                value = metric.value
+            else:
+                # histogram 是累計值，與上次取樣相減得到這個區間的數值
+                count, total = metric.count, metric.total
+                last_count, last_total = self.last_totals.get(name, (0, 0.0))
+                self.last_totals[name] = (count, total)
+                delta_count = count - last_count
+                delta_total = total - last_total
+                if kind == 'hist_sum':
+                    value = delta_total
+                else:
+                    value = delta_total / delta_count if delta_count > 0 else 0.0
+            self.history[name].append(value)
+
+    def _redraw(self):
+        surface = self.surface
+        surface.fill(self.COLOR_BG)
+        x = self.margin
+        graph_w = self.panel_w - self.margin * 2
+        for row, (label, name, _, limit, unit) in enumerate(HUD_SERIES):
+            y = self.margin + row * self.row_h
+            values = self.history[name]
+            current = values[-1] if values else 0.0
+            text = self.font.render(f"{label}: {current:.1f} {unit}", True, self.COLOR_TEXT)
+            surface.blit(text, (x, y))
+
+            top = y + self.row_h - self.graph_h - self._px(4)
+            bottom = top + self.graph_h
+            pygame.draw.rect(surface, self.COLOR_GRID, (x, top, graph_w, self.graph_h), 1)
+            if name == "main.frame_ms":
+                budget_y = bottom - int(min(self.budget_ms / limit, 1.0) * self.graph_h)
+                pygame.draw.line(surface, self.COLOR_WARN, (x, budget_y), (x + graph_w, budget_y), 1)
+
+            if len(values) >= 2:
+                step = graph_w / (values.maxlen - 1)
+                offset = values.maxlen - len(values)
+                points = [
+                    (x + int((offset + i) * step), bottom - int(min(v / limit, 1.0) * self.graph_h))
+                    for i, v in enumerate(values)
+                ]
+                color = self.COLOR_WARN if name == "main.frame_ms" and current > self.budget_ms else self.COLOR_LINE
+                pygame.draw.lines(surface, color, False, points, 1)
+
+    def draw(self, screen):
+        """每幀呼叫：到了取樣時間才重畫快取 surface，否則只 blit"""
+        now = time.perf_counter()
+        if now - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = now
+            self._sample()
+            self._redraw()
+        screen.blit(self.surface, self.position)
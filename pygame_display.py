@@ -5,8 +5,8 @@ Pygame 顯示模組 - 替代 OpenCV 的 imshow
 
 import os
 import pygame
-import cv2
 import numpy as np
+from tracer import tracer
 
 # 設定視窗位置到螢幕左上角
 os.environ['SDL_VIDEO_WINDOW_POS'] = '0,0'
@@ -15,49 +15,85 @@ os.environ['SDL_VIDEO_WINDOW_POS'] = '0,0'
 class PygameDisplay:
     """Pygame 顯示器 - 高效能畫面顯示"""
     
-    def __init__(self, width=1920, height=1080, title="Rehab System - Rhythm Game", fullscreen=False):
+    def __init__(self, width=1920, height=1080, title="Rehab System - Rhythm Game", fullscreen=False, window_size=None):
+        """
+        width, height: 內部渲染解析度（所有畫面與 UI 都畫在這個尺寸）
+        window_size: 視窗大小；與內部解析度不同時，只在呈現時放大一次
+        """
         pygame.init()
         
+        self.window_size = window_size or (width, height)
+        self.fullscreen = fullscreen
+        self._create_surfaces(width, height)
+        
+        pygame.display.set_caption(title)
+        self.should_quit = False
+        self.hud_visible = False  # 效能 HUD（F3 切換）
+    
+    def _create_surfaces(self, width, height):
+        """依內部解析度建立顯示 surface 與上傳用的 frame_surface"""
         self.width = width
         self.height = height
+        self.window = None  # 需要縮放時的實際視窗 surface
         
-        if fullscreen:
-            self.screen = pygame.display.set_mode(
-                (width, height), 
-                pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF
+        if self.fullscreen:
+            # SCALED：由 SDL 以 GPU 把內部解析度拉伸到全螢幕
+            flags = pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF
+            if self.window_size != (width, height):
+                flags |= pygame.SCALED
+            self.screen = pygame.display.set_mode((width, height), flags)
+        elif self.window_size != (width, height):
+            # 視窗模式：畫在內部解析度的 surface 上，flip 前做一次縮放 blit
+            self.window = pygame.display.set_mode(
+                self.window_size, 
+                pygame.NOFRAME | pygame.HWSURFACE | pygame.DOUBLEBUF
             )
+            self.screen = pygame.Surface((width, height)).convert()
         else:
             self.screen = pygame.display.set_mode(
                 (width, height), 
                 pygame.NOFRAME | pygame.HWSURFACE | pygame.DOUBLEBUF
             )
         
-        pygame.display.set_caption(title)
-        self.should_quit = False
+        # 常駐的畫面大小 surface，channel mask 設成 BGR 順序
+        # OpenCV 的 BGR 畫面可以直接 memcpy 進去，不需要色彩轉換與 tobytes()
+        self.frame_surface = pygame.Surface(
+            (width, height), 0, 24, (0xFF0000, 0x00FF00, 0x0000FF, 0)
+        )
+        self.frame_pitch = self.frame_surface.get_pitch()
+    
+    def set_render_size(self, width, height):
+        """改變內部渲染解析度（視窗大小不變）"""
+        if (width, height) != (self.width, self.height):
+            self._create_surfaces(width, height)
+    
+    def _upload(self, frame):
+        """把 BGR 畫面直接寫進 frame_surface 的像素記憶體（只有一次 memcpy）"""
+        h, w = frame.shape[:2]
+        if (w, h) != (self.width, self.height):
+            # 尺寸不符時退回舊路徑（不常發生）
+            return pygame.image.frombuffer(frame.tobytes(), (w, h), 'BGR')
+        
+        # 像素緩衝區的 numpy view；每列可能有對齊用的 padding，所以用 pitch 切
+        pixels = np.frombuffer(self.frame_surface.get_buffer(), dtype=np.uint8)
+        pixels = pixels.reshape(h, self.frame_pitch)[:, :w * 3].reshape(h, w, 3)
+        np.copyto(pixels, frame)
+        del pixels  # 釋放 buffer，surface 解鎖後才能 blit
+        return self.frame_surface
     
     def show(self, frame):
         """顯示 OpenCV 格式的畫面 (BGR)"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        surface = pygame.image.frombuffer(
-            rgb_frame.tobytes(), 
-            (rgb_frame.shape[1], rgb_frame.shape[0]),
-            'RGB'
-        )
-        self.screen.blit(surface, (0, 0))
-        pygame.display.flip()
+        self.screen.blit(self._upload(frame), (0, 0))
+        self.flip()
     
     def blit_frame(self, frame):
         """只把 OpenCV 畫面放到 screen 上，不做 flip（用於需要額外繪製的情況）"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        surface = pygame.image.frombuffer(
-            rgb_frame.tobytes(), 
-            (rgb_frame.shape[1], rgb_frame.shape[0]),
-            'RGB'
-        )
-        self.screen.blit(surface, (0, 0))
+        self.screen.blit(self._upload(frame), (0, 0))
     
     def flip(self):
         """更新顯示（用於 blit_frame 之後）"""
+        if self.window is not None:
+            pygame.transform.scale(self.screen, self.window_size, self.window)
         pygame.display.flip()
     
     def get_screen(self):
@@ -72,6 +108,11 @@ class PygameDisplay:
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
                     self.should_quit = True
+                elif event.key == pygame.K_F3:
+                    self.hud_visible = not self.hud_visible
+                elif event.key == pygame.K_F9 and tracer.enabled:
+                    # 立即輸出目前記錄到的 trace
+                    tracer.dump()
         return self.should_quit
     
     def close(self):
@@ -4,20 +4,84 @@ Pygame UI 渲染器 - 使用 Pygame 繪製遊戲 UI
 
 import pygame
 import math
+from collections import OrderedDict
+from utils import ui_scale
+from metrics import registry
+
+
+class TextCache:
+    """文字 surface 快取 - 以 (字型, 文字, 顏色, 描邊色) 為 key 的 LRU，描邊會預先合成好"""
+    
+    # 描邊偏移（黑色偏移，只用 4 個對角方向）
+    OUTLINE_OFFSETS = [(-2, -2), (-2, 2), (2, -2), (2, 2)]
+    OUTLINE_PAD = 2
+    
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hit_counter = registry.counter("text_cache.hits", description="文字快取命中")
+        self.miss_counter = registry.counter("text_cache.misses", description="文字快取未命中")
+    
+    def get(self, font, text, color, outline_color=None):
+        """取得文字 surface；有描邊時 surface 四周各多 OUTLINE_PAD 像素"""
+        key = (font, text, color, outline_color)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hit_counter.inc()
+            return surface
+        
+        self.miss_counter.inc()
+        surface = self._render(font, text, color, outline_color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return surface
+    
+    def _render(self, font, text, color, outline_color):
+        main_text = font.render(text, True, color)
+        if outline_color is None:
+            return main_text
+        
+        pad = self.OUTLINE_PAD
+        outline_text = font.render(text, True, outline_color)
+        w, h = main_text.get_size()
+        surface = pygame.Surface((w + pad * 2, h + pad * 2), pygame.SRCALPHA)
+        for ox, oy in self.OUTLINE_OFFSETS:
+            surface.blit(outline_text, (pad + ox, pad + oy))
+        surface.blit(main_text, (pad, pad))
+        return surface
+    
+    def get_stats(self):
+        """取得快取命中統計"""
+        hits = self.hit_counter.value
+        misses = self.miss_counter.value
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'size': len(self.entries),
+            'hit_rate': hits / total * 100 if total > 0 else 0
+        }
 
 
 class PygameUI:
     """使用 Pygame 繪製 UI 元素"""
     
-    def __init__(self, width=1920, height=1080, zone_count=8):
+    NOTE_SHADOW_OFFSET = 3  # 1920 寬基準下的陰影位移，依解析度縮放
+    NOTE_SUPERSAMPLE = 4  # 先放大畫再縮小，得到反鋸齒邊緣
+    
+    def __init__(self, width=1920, height=1080, zone_count=8, note_radius=None):
         self.width = width
         self.height = height
+        # 版面以 1920 寬為基準，依內部解析度等比例縮放
+        self.scale = ui_scale(width)
         
         # 初始化字體
         pygame.font.init()
-        self.font_large = pygame.font.SysFont('Arial', 48, bold=True)
-        self.font_medium = pygame.font.SysFont('Arial', 36, bold=True)
-        self.font_small = pygame.font.SysFont('Arial', 24)
+        self.font_large = pygame.font.SysFont('Arial', self._px(48), bold=True)
+        self.font_medium = pygame.font.SysFont('Arial', self._px(36), bold=True)
+        self.font_small = pygame.font.SysFont('Arial', self._px(24))
         
         # 顏色定義 (RGB for Pygame)
         self.COLOR_WHITE = (255, 255, 255)
@@ -29,17 +93,34 @@ class PygameUI:
         self.COLOR_ORANGE = (255, 200, 0)
         self.COLOR_ARC = (0, 200, 255)
         
+        # 文字 surface 快取（分數、歌名等不變的字串只需一次 blit）
+        self.text_cache = TextCache()
+        self.text_outline = True  # 文字描邊開關（畫質調節器可關閉）
+        
         # 預計算弧線幾何（只計算一次）
         self._init_arc_geometry(width, height, zone_count)
-    
-    def draw_game_ui(self, screen, arc_info, notes_data, score, accuracy, combo, song_name, fps, time_progress):
-        """在 Pygame screen 上繪製遊戲 UI"""
-        # 繪製頂部面板
-        self._draw_dashboard(screen, score, accuracy, song_name, time_progress)
         
-        # 繪製遊戲弧線
+        # 音符 sprite atlas（每種外觀預先畫好一張）
+        if note_radius is None:
+            note_radius = max(1, self._px(30))
+        self._init_note_atlas(note_radius)
+    
+    def _px(self, value):
+        """把 1920 寬基準下的像素值換算成目前解析度"""
+        return int(round(value * self.scale))
+    
+    def draw_game_ui(self, screen, arc_info, notes_data, score, accuracy, combo, song_name, fps, time_progress,
+                     text_outline=True):
+        """在 Pygame screen 上繪製遊戲 UI（text_outline=False 時文字不畫描邊，由畫質調節器控制）"""
+        self.text_outline = text_outline
+        # 繪製靜態圖層：遊戲弧線與進度條軌道（區域數改變時才重建）
+        if arc_info is not None and arc_info['zone_count'] != self.zone_count:
+            self._init_arc_geometry(self.width, self.height, arc_info['zone_count'])
         self._draw_arc(screen, arc_info)
         
+        # 繪製頂部面板（進度條要畫在軌道之上）
+        self._draw_dashboard(screen, score, accuracy, song_name, time_progress)
+        
         # 繪製音符
         self._draw_notes(screen, notes_data)
         
@@ -51,39 +132,35 @@ class PygameUI:
         self._draw_fps(screen, fps)
     
     def _draw_text_with_outline(self, screen, font, text, pos, color, outline_color=(0, 0, 0)):
-        """繪製帶描邊的文字"""
+        """繪製帶描邊的文字（從快取取出預先合成好的 surface）"""
         x, y = pos
-        # 繪製描邊（黑色偏移，只用 4 個對角方向）
-        outline_offsets = [(-2, -2), (-2, 2), (2, -2), (2, 2)]
-        for ox, oy in outline_offsets:
-            outline_text = font.render(text, True, outline_color)
-            screen.blit(outline_text, (x + ox, y + oy))
-        # 繪製主文字
-        main_text = font.render(text, True, color)
-        screen.blit(main_text, (x, y))
-        return main_text.get_width()
+        if not self.text_outline:
+            outline_color = None
+        pad = TextCache.OUTLINE_PAD if outline_color is not None else 0
+        text_surface = self.text_cache.get(font, text, color, outline_color)
+        screen.blit(text_surface, (x - pad, y - pad))
+        return text_surface.get_width() - pad * 2
     
     def _draw_dashboard(self, screen, score, accuracy, song_name, time_progress):
         """繪製頂部儀表板（無背景版，文字有描邊）"""
-        w, h = self.width, 100
-        
-        # 時間進度條
-        bar_bg = pygame.Rect(20, h - 10, w - 40, 10)
-        pygame.draw.rect(screen, (30, 30, 30), bar_bg)
+        w = self.width
+        margin = self._px(20)
         
-        bar_width = int((w - 40) * min(time_progress, 1.0))
+        # 時間進度條（底色軌道在靜態圖層裡，這裡只畫進度）
+        track = self.bar_track_rect
+        bar_width = int(track.width * min(time_progress, 1.0))
         if bar_width > 0:
-            bar_fg = pygame.Rect(20, h - 10, bar_width, 10)
+            bar_fg = pygame.Rect(track.x, track.y, bar_width, track.height)
             pygame.draw.rect(screen, self.COLOR_ORANGE, bar_fg)
         
         # Score（帶描邊）
-        self._draw_text_with_outline(screen, self.font_large, f"SCORE: {score}", (20, 20), self.COLOR_WHITE)
+        self._draw_text_with_outline(screen, self.font_large, f"SCORE: {score}", (margin, margin), self.COLOR_WHITE)
         
         # 歌名（帶描邊）
         if song_name:
             text_width, _ = self.font_medium.size(song_name)
             song_x = (w - text_width) // 2
-            self._draw_text_with_outline(screen, self.font_medium, song_name, (song_x, 25), self.COLOR_WHITE)
+            self._draw_text_with_outline(screen, self.font_medium, song_name, (song_x, self._px(25)), self.COLOR_WHITE)
         
         # 命中率（帶描邊）
         if accuracy is not None:
@@ -91,13 +168,14 @@ class PygameUI:
             acc_str = f"{accuracy:.1f}%"
             text_width, _ = self.font_medium.size(acc_str)
             self._draw_text_with_outline(screen, self.font_medium, acc_str, 
-                                         (w - text_width - 30, 25), acc_color)
+                                         (w - text_width - self._px(30), self._px(25)), acc_color)
     
     def _init_arc_geometry(self, width, height, zone_count):
-        """預計算弧線幾何參數（只在初始化時執行一次）"""
+        """預計算弧線幾何參數並畫好靜態圖層（只在初始化或區域數改變時執行）"""
+        self.zone_count = zone_count
         center = (width // 2, height)
         radius = int(width * 0.4)
-        hit_tolerance = 80
+        hit_tolerance = int(80 * ui_scale(width))
         outer_radius = radius + hit_tolerance
         inner_radius = radius - hit_tolerance
         zone_angle_width = 180 / zone_count
@@ -121,50 +199,97 @@ class PygameUI:
             end = (int(center[0] + outer_radius * math.cos(angle)), 
                    int(center[1] - outer_radius * math.sin(angle)))
             self.zone_lines.append((start, end))
+        
+        margin = self._px(20)
+        bar_height = max(1, self._px(10))
+        self.bar_track_rect = pygame.Rect(margin, self._px(100) - bar_height, width - margin * 2, bar_height)
+        self._build_static_layer()
     
-    def _draw_arc(self, screen, arc_info=None):
-        """繪製判定區弧線（使用預計算的幾何參數）"""
-        # 直接使用預計算的值，不需要每幀重新計算
-        pygame.draw.arc(screen, self.COLOR_ARC, self.arc_outer_rect, 0, math.pi, 2)
-        pygame.draw.arc(screen, self.COLOR_ARC, self.arc_inner_rect, 0, math.pi, 2)
+    def _build_static_layer(self):
+        """
+        把靜態幾何（兩條弧線、區域分隔線、進度條軌道）畫進一張圖層
+        透明部分用 colorkey + RLE 壓縮，blit 時直接跳過，比逐像素 alpha 便宜
+        """
+        bounds = self.arc_outer_rect.union(self.bar_track_rect).clip(pygame.Rect(0, 0, self.width, self.height))
+        colorkey = (255, 0, 255)
+        layer = pygame.Surface(bounds.size)
+        layer.fill(colorkey)
         
-        # 繪製區域分隔線（使用預計算的端點）
+        offset_x, offset_y = -bounds.x, -bounds.y
+        pygame.draw.rect(layer, (30, 30, 30), self.bar_track_rect.move(offset_x, offset_y))
+        pygame.draw.arc(layer, self.COLOR_ARC, self.arc_outer_rect.move(offset_x, offset_y), 0, math.pi, 2)
+        pygame.draw.arc(layer, self.COLOR_ARC, self.arc_inner_rect.move(offset_x, offset_y), 0, math.pi, 2)
         for start, end in self.zone_lines:
-            pygame.draw.line(screen, self.COLOR_ARC, start, end, 2)
+            pygame.draw.line(layer, self.COLOR_ARC,
+                             (start[0] + offset_x, start[1] + offset_y),
+                             (end[0] + offset_x, end[1] + offset_y), 2)
+        
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert()
+        layer.set_colorkey(colorkey, pygame.RLEACCEL)
+        self.static_layer = layer
+        self.static_layer_pos = bounds.topleft
+    
+    def _draw_arc(self, screen, arc_info=None):
+        """繪製判定區弧線、分隔線與進度條軌道（一次 blit 預先畫好的靜態圖層）"""
+        screen.blit(self.static_layer, self.static_layer_pos)
+    
+    def _init_note_atlas(self, radius):
+        """
+        預先畫好每種外觀的音符（陰影 + 主體 + 白框），之後每幀只需 blit
+        外觀：命中/失誤看狀態，其餘看音符類型
+        """
+        self.note_radius = radius
+        colors = {
+            'normal': (200, 50, 50),  # 紅色
+            'bonus': self.COLOR_YELLOW,
+            'hit': self.COLOR_GREEN,
+            'miss': self.COLOR_RED,
+        }
+        ss = self.NOTE_SUPERSAMPLE
+        shadow = max(1, self._px(self.NOTE_SHADOW_OFFSET))
+        # 四周各留 1 像素給反鋸齒邊緣
+        size = radius * 2 + shadow + 2
+        center = (radius + 1) * ss
+        
+        self.note_sprites = {}
+        for look, color in colors.items():
+            big = pygame.Surface((size * ss, size * ss), pygame.SRCALPHA)
+            pygame.draw.circle(big, self.COLOR_BLACK, (center + shadow * ss, center + shadow * ss), radius * ss)
+            pygame.draw.circle(big, color, (center, center), radius * ss)
+            pygame.draw.circle(big, self.COLOR_WHITE, (center, center), radius * ss, 2 * ss)
+            sprite = pygame.transform.smoothscale(big, (size, size))
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            self.note_sprites[look] = sprite
+        # sprite 左上角相對於音符中心的偏移
+        self.note_sprite_offset = radius + 1
     
     def _draw_notes(self, screen, notes_data):
-        """繪製音符"""
+        """繪製音符（所有音符一次 blits 批次繪製）"""
+        if not notes_data:
+            return
+        if notes_data[0]['radius'] != self.note_radius:
+            self._init_note_atlas(int(notes_data[0]['radius']))
+        
+        sprites = self.note_sprites
+        offset = self.note_sprite_offset
+        batch = []
         for note in notes_data:
-            pos = note['pos']
-            radius = int(note['radius'])
             status = note['status']
-            note_type = note.get('type', 'normal')
-            
-            # 選擇顏色
-            if status == 'hit':
-                color = self.COLOR_GREEN
-            elif status == 'miss':
-                color = self.COLOR_RED
-            elif note_type == 'bonus':
-                color = self.COLOR_YELLOW
-            else:
-                color = (200, 50, 50)  # 紅色
-            
-            # 繪製陰影
-            pygame.draw.circle(screen, self.COLOR_BLACK, (pos[0]+3, pos[1]+3), radius)
-            # 繪製主體
-            pygame.draw.circle(screen, color, pos, radius)
-            # 繪製邊框
-            pygame.draw.circle(screen, self.COLOR_WHITE, pos, radius, 2)
+            look = status if status in ('hit', 'miss') else note.get('type', 'normal')
+            x, y = note['pos']
+            batch.append((sprites.get(look, sprites['normal']), (x - offset, y - offset)))
+        screen.blits(batch, False)
     
     def _draw_combo(self, screen, combo):
         """繪製連擊數"""
-        combo_text = self.font_large.render(f"{combo} COMBO", True, self.COLOR_CYAN)
+        combo_text = self.text_cache.get(self.font_large, f"{combo} COMBO", self.COLOR_CYAN)
         x = (self.width - combo_text.get_width()) // 2
-        y = self.height // 2 - 100
+        y = self.height // 2 - self._px(100)
         screen.blit(combo_text, (x, y))
     
     def _draw_fps(self, screen, fps):
         """繪製 FPS"""
-        fps_text = self.font_small.render(f"FPS: {int(fps)}", True, self.COLOR_GREEN)
-        screen.blit(fps_text, (20, self.height - 30))
+        fps_text = self.text_cache.get(self.font_small, f"FPS: {int(fps)}", self.COLOR_GREEN)
+        screen.blit(fps_text, (self._px(20), self.height - self._px(30)))
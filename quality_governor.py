@@ -0,0 +1,129 @@
+"""
+畫質調節器 - 依實際幀時間自動升降畫質等級
+每幀回報主迴圈耗時，每 window 幀檢查一次平均值：
+超出預算就降一級；持續低於預算一段時間才升一級（遲滯，避免來回跳動）
+render_scale 要到下一首歌才生效：降到新的解析度等級後，套用之前不再往下降
+"""
+
+
+def _build_levels():
+    """由高到低的畫質等級，每一級都在上一級的基礎上再多關掉一項"""
+    base = {
+        'name': '最高',
+        'video_blend': True,      # 是否合成背景影片（False = 只顯示攝影機）
+        'video_frame_step': 1,    # 背景影片每幾幀解碼一幀（其餘只 grab）
+        'pose_width': 640,        # 姿態偵測輸入寬度
+        'pose_interval': 1,       # 每幾個攝影機畫面做一次姿態偵測
+        'text_outline': True,     # 遊戲 UI 文字描邊
+        'render_scale': 1.0,      # 內部渲染解析度倍率（下一首歌開始前才套用）
+    }
+    steps = [
+        ('無文字描邊', {'text_outline': False}),
+        ('影片半幀率', {'video_frame_step': 2}),
+        ('姿態 480', {'pose_width': 480}),
+        ('姿態隔幀', {'pose_interval': 2}),
+        ('無背景影片', {'video_blend': False}),
+        ('解析度 75%', {'render_scale': 0.75}),
+        ('解析度 50%', {'render_scale': 0.5, 'pose_width': 320}),
+    ]
+    levels = [base]
+    for name, overrides in steps:
+        level = dict(levels[-1])
+        level.update(overrides)
+        level['name'] = name
+        levels.append(level)
+    return levels
+
+
+QUALITY_LEVELS = _build_levels()
+
+
+class QualityGovernor:
+    """
+    畫質調節器 - 目標幀預算 + 遲滯
+    degrade_ratio: 平均幀時間超過 預算 × 此倍率 就降級
+    upgrade_ratio: 平均幀時間低於 預算 × 此倍率 持續 upgrade_window 幀才升級
+    """
+
+    def __init__(self, target_fps=30, levels=None, window=90, upgrade_window=450,
+                 degrade_ratio=1.15, upgrade_ratio=0.7, enabled=True):
+        self.levels = levels or QUALITY_LEVELS
+        self.budget_ms = 1000.0 / target_fps
+        self.window = window
+        self.upgrade_window = upgrade_window
+        self.degrade_ratio = degrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.enabled = enabled
+        self.level = 0
+        self.applied_render_scale = 1.0  # 目前實際使用的 render_scale（由主程式在兩首歌之間套用後回報）
+
+        self.sample_count = 0
+        self.sample_total = 0.0
+        self.good_frames = 0     # 連續低於升級門檻的幀數
+        self.last_avg_ms = 0.0
+        self.change_count = 0
+
+    @property
+    def settings(self):
+        """目前等級的設定 dict"""
+        return self.levels[self.level]
+
+    def update(self, frame_ms):
+        """回報一幀的耗時 (ms)，等級改變時回傳 True"""
+        if not self.enabled:
+            return False
+        self.sample_count += 1
+        self.sample_total += frame_ms
+        if self.sample_count < self.window:
+            return False
+
+        avg = self.sample_total / self.sample_count
+        self.last_avg_ms = avg
+        self.sample_count = 0
+        self.sample_total = 0.0
+
+        if avg > self.budget_ms * self.degrade_ratio:
+            self.good_frames = 0
+            # 解析度改變還在等下一首歌套用：這段期間的幀時間反映不出降級效果，不再往下降
+            pending = self.settings['render_scale'] != self.applied_render_scale
+            if self.level < len(self.levels) - 1 and not pending:
+                self._set_level(self.level + 1, avg)
+                return True
+        elif avg < self.budget_ms * self.upgrade_ratio:
+            self.good_frames += self.window
+            if self.good_frames >= self.upgrade_window and self.level > 0:
+                self.good_frames = 0
+                self._set_level(self.level - 1, avg)
+                return True
+        else:
+            self.good_frames = 0
+        return False
+
+    def _set_level(self, level, avg_ms):
+        old = self.levels[self.level]['name']
+        direction = "降低" if level > self.level else "提高"
+        self.level = level
+        self.change_count += 1
+        print(f"畫質{direction}: {old} → {self.settings['name']} (等級 {level}, "
+              f"平均 {avg_ms:.1f} ms / 預算 {self.budget_ms:.1f} ms)")
+
+    def set_applied_render_scale(self, scale):
+        """主程式套用 render_scale 後回報，解除降級的暫停"""
+        self.applied_render_scale = scale
+
+    def reset_samples(self):
+        """切換場景（例如新的一首歌開始）時丟掉尚未統計的樣本"""
+        self.sample_count = 0
+        self.sample_total = 0.0
+        self.good_frames = 0
+
+    def get_stats(self):
+        """取得調節統計"""
+        return {
+            'level': self.level,
+            'name': self.settings['name'],
+            'render_scale': self.applied_render_scale,
+            'avg_frame_ms': self.last_avg_ms,
+            'budget_ms': self.budget_ms,
+            'change_count': self.change_count
+        }
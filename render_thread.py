@@ -0,0 +1,191 @@
+"""
+呈現執行緒 - 獨佔 pygame，以穩定的節奏呈現最新完成的畫面
+主執行緒（遊戲邏輯 + 合成）透過三重緩衝交出「畫面 + UI 狀態」，不必等 flip / vsync
+"""
+
+import threading
+import time
+import numpy as np
+import pygame
+from pygame_display import PygameDisplay
+from pygame_ui import PygameUI
+from perf_hud import PerfHud
+from tracer import tracer
+from metrics import registry
+from utils import profile_gate
+
+
+class TripleBuffer:
+    """
+    三重緩衝 - 三個 slot 分別為 back（生產者寫入中）、pending（最新完成）、front（呈現中）
+    生產者 publish 時交換 back/pending，呈現端 acquire 時交換 pending/front，兩邊互不等待
+    """
+
+    def __init__(self, width, height):
+        self.slots = [
+            {'buffer': np.empty((height, width, 3), dtype=np.uint8), 'frame': None, 'state': None, 'frame_id': None,
+             'size': (width, height)}
+            for _ in range(3)
+        ]
+        self.back = 0
+        self.pending = 1
+        self.front = 2
+        self.fresh = False
+        self.cond = threading.Condition()
+
+    def back_buffer(self):
+        """生產者可寫入的畫面緩衝區（publish 之前呈現端不會碰它）"""
+        return self.slots[self.back]['buffer']
+
+    def publish(self, frame, state=None, frame_id=None):
+        """生產者：交出一幀（frame 可以是 back_buffer() 或其他不會再被修改的陣列）"""
+        slot = self.slots[self.back]
+        slot['frame'] = frame
+        slot['state'] = state
+        slot['frame_id'] = frame_id
+        slot['size'] = (frame.shape[1], frame.shape[0])  # 呈現端依此判斷是否要先換解析度
+        with self.cond:
+            self.back, self.pending = self.pending, self.back
+            self.fresh = True
+            self.cond.notify()
+
+    def acquire(self, timeout=None):
+        """呈現端：取得最新完成的一幀，回傳 (slot, 是否為新的一幀)"""
+        with self.cond:
+            if not self.fresh and timeout:
+                self.cond.wait(timeout)
+            if self.fresh:
+                self.front, self.pending = self.pending, self.front
+                self.fresh = False
+                return self.slots[self.front], True
+            return self.slots[self.front], False
+
+
+class RenderThread:
+    """呈現執行緒 - 建立視窗、繪製 Pygame UI、flip 與事件處理都在這個執行緒"""
+
+    def __init__(self, width=1920, height=1080, title="Rehab System - Rhythm Game", target_fps=60, threaded=True,
+                 window_size=None):
+        self.width = width
+        self.height = height
+        self.window_size = window_size  # None = 視窗與內部解析度相同
+        self.title = title
+        self.target_fps = target_fps
+        self.threaded = threaded  # False：在 submit() 裡同步呈現（某些平台視窗必須在主執行緒）
+        self.buffers = TripleBuffer(width, height)
+        self.display = None
+        self.ui = None
+        self.hud = None
+        self.thread = None
+        self.stopped = False
+        self.should_quit = False
+        self.ready = threading.Event()
+        self.render_size = (width, height)  # 呈現端目前 surface / UI 的尺寸（只在呈現端更新）
+
+        # 呈現統計
+        self.present_count = 0
+        self.present_hist = registry.histogram("render.present_ms", description="畫面呈現")
+
+    def start(self):
+        if self.threaded:
+            self.thread = threading.Thread(target=self._run, args=(), daemon=True, name="RenderThread")
+            self.thread.start()
+            self.ready.wait()
+        else:
+            self._init_pygame()
+        return self
+
+    def _init_pygame(self):
+        self.display = PygameDisplay(self.width, self.height, self.title, window_size=self.window_size)
+        self.ui = PygameUI(width=self.width, height=self.height)
+        self.hud = PerfHud(self.width, self.height)
+
+    def _run(self):
+        """背景執行緒：固定節奏取出最新一幀呈現，並處理視窗事件"""
+        self._init_pygame()
+        self.ready.set()
+        clock = pygame.time.Clock()
+        while not self.stopped:
+            slot, fresh = self.buffers.acquire(timeout=1.0 / self.target_fps)
+            if fresh:
+                self._present(slot)
+            with profile_gate.work():
+                if self.display.process_events():
+                    self.should_quit = True
+            clock.tick(self.target_fps)
+        self.display.close()
+
+    def _apply_render_size(self, width, height):
+        """呈現端：重建顯示 surface 與 Pygame UI"""
+        self.render_size = (width, height)
+        self.display.set_render_size(width, height)
+        self.ui = PygameUI(width=width, height=height)
+        self.hud = PerfHud(width, height)
+
+    def set_render_size(self, width, height):
+        """
+        主執行緒：改變內部渲染解析度（在兩首歌之間呼叫）
+        新的三重緩衝立即生效；呈現端在拿到第一張新尺寸的畫面時才重建 surface 與 UI，
+        舊尺寸的畫面不會用新的 surface 呈現，反之亦然
+        """
+        if (width, height) == (self.width, self.height):
+            return
+        self.width = width
+        self.height = height
+        old = self.buffers
+        self.buffers = TripleBuffer(width, height)
+        with old.cond:
+            old.cond.notify()
+
+    def _present(self, slot):
+        """把畫面上傳到螢幕、疊上遊戲 UI 後 flip"""
+        tracer.set_frame_id(slot['frame_id'])
+        # 工作區段只包 CPU 繪製；flip 可能等垂直同步，不納入
+        with profile_gate.work():
+            if slot['size'] != self.render_size:
+                self._apply_render_size(*slot['size'])
+            start_time = time.perf_counter()
+            with tracer.span("render.upload"):
+                self.display.blit_frame(slot['frame'])
+            state = slot['state']
+            if state is not None:
+                with tracer.span("render.ui"):
+                    self.ui.draw_game_ui(self.display.get_screen(), **state)
+            if self.display.hud_visible:
+                with tracer.span("render.hud"):
+                    self.hud.draw(self.display.get_screen())
+        with tracer.span("render.flip"):
+            self.display.flip()
+        self.present_count += 1
+        self.present_hist.observe((time.perf_counter() - start_time) * 1000)
+
+    def back_buffer(self):
+        """主執行緒：取得可直接寫入的畫面緩衝區（例如合成器的輸出）"""
+        return self.buffers.back_buffer()
+
+    def submit(self, frame, ui_state=None, frame_id=None):
+        """
+        主執行緒：交出完成的一幀
+        ui_state: PygameUI.draw_game_ui 的參數 dict；None 代表只顯示畫面（選單、結算）
+        frame_id: 主迴圈的幀 ID（trace 用）
+        """
+        self.buffers.publish(frame, ui_state, frame_id)
+        if not self.threaded:
+            slot, fresh = self.buffers.acquire()
+            if fresh:
+                self._present(slot)
+
+    def process_events(self):
+        """主執行緒：回傳是否應該關閉（事件由呈現執行緒處理）"""
+        if not self.threaded and self.display.process_events():
+            self.should_quit = True
+        return self.should_quit
+
+    def stop(self):
+        self.stopped = True
+        if self.thread is not None:
+            with self.buffers.cond:
+                self.buffers.cond.notify()
+            self.thread.join(timeout=1.0)
+        elif self.display is not None:
+            self.display.close()
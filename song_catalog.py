@@ -0,0 +1,202 @@
+"""
+歌曲目錄 - 啟動時掃描 music/、beatmap/、video/，建立持久化索引（長度、BPM、譜面與影片是否存在）
+索引存在 song_index.json：每首歌記下相關檔案的 mtime 與大小，只有變更過的歌曲才重新開檔讀取
+BPM 等數值來自 generate_beatmap_librosa 寫出的 <歌名>_meta.json，
+手動設定放在 <歌名>_overrides.json（例如 {"bpm": 97, "note_speed": 7}），疊加在 meta 上且不會被重新分析覆蓋
+選單依索引分頁顯示，歌曲再多也只畫目前這一頁
+"""
+
+import os
+import json
+import wave
+
+
+# 支援的音訊副檔名（與 generate_beatmap_librosa 相同）
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+
+# 沒有 meta（尚未用 generate_beatmap_librosa 分析）的歌曲使用的預設值
+DEFAULT_BPM = 120
+DEFAULT_NOTE_SPEED = 7
+
+# 難度（與 generate_beatmap_librosa.DIFFICULTIES 相同）：normal 沿用原本的檔名，其他難度加上 _<難度> 後綴
+DIFFICULTIES = ("easy", "normal", "hard")
+DEFAULT_DIFFICULTY = "normal"
+
+# 索引格式改變時加一，讓舊索引整個重建
+INDEX_VERSION = 3
+
+
+def difficulty_suffix(difficulty):
+    return "" if difficulty in (None, DEFAULT_DIFFICULTY) else f"_{difficulty}"
+
+
+def _list_files(folder):
+    """列出資料夾內的檔案 -> {檔名: [mtime, 大小]}（scandir 一次取得，不必逐檔 stat）"""
+    files = {}
+    if not os.path.isdir(folder):
+        return files
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = [stat.st_mtime, stat.st_size]
+    return files
+
+
+def read_duration(music_path):
+    """WAV 只讀檔頭取得長度；其他格式或讀取失敗回傳 None"""
+    if not music_path.lower().endswith(".wav"):
+        return None
+    try:
+        with wave.open(music_path, "rb") as f:
+            return f.getnframes() / float(f.getframerate())
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+class SongCatalog:
+    """歌曲目錄 - scan() 增量更新索引，page() 取得選單的一頁"""
+
+    def __init__(self, base_dir, music_folder="music", beatmap_folder="beatmap", video_folder="video",
+                 index_path=None):
+        self.base_dir = base_dir
+        self.music_folder = music_folder
+        self.music_dir = os.path.join(base_dir, music_folder)
+        self.beatmap_dir = os.path.join(base_dir, beatmap_folder)
+        self.video_dir = os.path.join(base_dir, video_folder)
+        self.index_path = index_path or os.path.join(base_dir, "song_index.json")
+        self.index = self._load_index()
+        self.songs = []
+        self.variants = {}  # (檔名, 難度) -> 指定難度的歌曲項目（同一組合每次回傳同一個 dict）
+        self.refreshed = 0  # 上次 scan 重新讀取的歌曲數
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'version': INDEX_VERSION, 'songs': {}}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception:
+            return {'version': INDEX_VERSION, 'songs': {}}
+        if index.get('version') != INDEX_VERSION:
+            return {'version': INDEX_VERSION, 'songs': {}}
+        return index
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def scan(self):
+        """掃描三個資料夾並更新索引（相關檔案都沒變的歌曲直接沿用索引內容）"""
+        music_files = _list_files(self.music_dir)
+        beatmap_files = _list_files(self.beatmap_dir)
+        video_files = _list_files(self.video_dir)
+
+        old_songs = self.index['songs']
+        songs = {}
+        self.refreshed = 0
+        for filename in sorted(music_files):
+            if not filename.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            filename_no_ext = os.path.splitext(filename)[0]
+            # 簽章 = 這首歌相關檔案的 [mtime, 大小]（不存在為 None），任何一個改變就重新讀取
+            related = {
+                'music': (music_files, filename),
+                'meta': (beatmap_files, f"{filename_no_ext}_meta.json"),
+                'overrides': (beatmap_files, f"{filename_no_ext}_overrides.json"),
+                'video': (video_files, f"{filename_no_ext}.mp4"),
+            }
+            for difficulty in DIFFICULTIES:
+                base = filename_no_ext + difficulty_suffix(difficulty)
+                related[f"{difficulty}.beatmap"] = (beatmap_files, f"{base}.txt")
+                related[f"{difficulty}.chart"] = (beatmap_files, f"{base}_chart.json")
+            signature = {key: files.get(name) for key, (files, name) in related.items()}
+            entry = old_songs.get(filename)
+            if entry is None or entry['signature'] != signature:
+                entry = self._read_song(filename, signature)
+                self.refreshed += 1
+            songs[filename] = entry
+
+        changed = self.refreshed > 0 or len(songs) != len(old_songs)
+        self.index['songs'] = songs
+        self.songs = list(songs.values())
+        self.variants = {}
+        if changed:
+            try:
+                self._save_index()
+            except OSError as e:
+                print(f"歌曲索引寫入失敗: {e}")
+        print(f"歌曲目錄: {len(self.songs)} 首（重新讀取 {self.refreshed} 首）")
+        return self
+
+    def _read_song(self, filename, signature):
+        """讀取一首歌的 meta（疊加手動設定）與音訊長度，建立索引項目（格式與 resolve_song_paths 需要的欄位相容）"""
+        filename_no_ext = os.path.splitext(filename)[0]
+        meta = {}
+        for key in ('meta', 'overrides'):
+            if signature[key] is not None:
+                meta.update(self._read_json(f"{filename_no_ext}_{key}.json"))
+
+        duration = read_duration(os.path.join(self.music_dir, filename))
+        if duration is None:
+            duration = meta.get('duration')
+
+        return {
+            'name': filename_no_ext,
+            'filename': filename,
+            'folder': self.music_folder,
+            'bpm': meta.get('bpm', DEFAULT_BPM),
+            'note_speed': meta.get('note_speed', DEFAULT_NOTE_SPEED),
+            'duration': duration,
+            'has_beatmap': signature['normal.beatmap'] is not None,
+            'has_chart': signature['normal.chart'] is not None,
+            'has_video': signature['video'] is not None,
+            # 有譜面的難度；normal 一定可選（沒有譜面時遊戲使用預設節奏）
+            'difficulties': [
+                difficulty for difficulty in DIFFICULTIES
+                if difficulty == DEFAULT_DIFFICULTY
+                or signature[f"{difficulty}.beatmap"] is not None or signature[f"{difficulty}.chart"] is not None
+            ],
+            'signature': signature,
+        }
+
+    def _read_json(self, name):
+        """讀取 beatmap 資料夾內的 JSON（讀取失敗或格式不對回傳空 dict）"""
+        try:
+            with open(os.path.join(self.beatmap_dir, name), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def __len__(self):
+        return len(self.songs)
+
+    def page_count(self, page_size):
+        return max(1, (len(self.songs) + page_size - 1) // page_size)
+
+    def page(self, page, page_size, difficulty=DEFAULT_DIFFICULTY):
+        """
+        回傳第 page 頁的歌曲（指定難度；沒有這個難度譜面的歌曲維持 normal）
+        同一首歌、同一難度每次回傳同一個 dict，預載器以此判斷是否同一首
+        """
+        start = page * page_size
+        return [self.variant(song, difficulty) for song in self.songs[start:start + page_size]]
+
+    def variant(self, song, difficulty):
+        """歌曲的指定難度版本（多一個 difficulty 欄位，resolve_song_paths 依此選譜面檔）"""
+        if difficulty == DEFAULT_DIFFICULTY or difficulty not in song['difficulties']:
+            return song
+        key = (song['filename'], difficulty)
+        entry = self.variants.get(key)
+        if entry is None:
+            signature = song['signature']
+            entry = self.variants[key] = dict(
+                song,
+                difficulty=difficulty,
+                has_beatmap=signature[f"{difficulty}.beatmap"] is not None,
+                has_chart=signature[f"{difficulty}.chart"] is not None,
+            )
+        return entry
@@ -0,0 +1,112 @@
+"""
+打擊音效模組 - 啟動時預載解碼好的音效，並保留固定數量的 mixer channel
+播放只是把已解碼的 Sound 丟給 channel，不會阻塞遊戲迴圈
+"""
+
+import os
+import time
+import numpy as np
+import pygame
+from music_controller import init_mixer, MIXER_BUFFER
+from metrics import registry
+
+
+# play() 只是把 Sound 丟給 channel，耗時在 1 ms 以下，用較細的區間
+DISPATCH_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+
+
+class SoundEffects:
+    """打擊音效播放器 - 預載音效 + 固定 channel 池"""
+
+    # 音效檔名；檔案不存在時改用合成音
+    SOUND_FILES = {
+        'hit': 'hit.wav',
+        'bonus': 'bonus.wav',
+        'miss': 'miss.wav',
+    }
+
+    # 合成音參數：(頻率 Hz, 長度 秒, 音量)
+    FALLBACK_TONES = {
+        'hit': (880, 0.08, 0.5),
+        'bonus': (1320, 0.12, 0.5),
+        'miss': (220, 0.10, 0.3),
+    }
+
+    def __init__(self, sound_dir, channel_count=4, volume=0.6):
+        init_mixer()
+        self.frequency, self.size, self.mixer_channels = pygame.mixer.get_init()
+
+        # 保留前 channel_count 個 channel 給音效，不會被其他 Sound.play() 搶走
+        if pygame.mixer.get_num_channels() < channel_count:
+            pygame.mixer.set_num_channels(channel_count)
+        pygame.mixer.set_reserved(channel_count)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channel_count)]
+        self.next_channel = 0
+
+        self.sounds = {}
+        for name, filename in self.SOUND_FILES.items():
+            sound = self._load_sound(os.path.join(sound_dir, filename), name)
+            sound.set_volume(volume)
+            self.sounds[name] = sound
+
+        # 延遲統計：只量得到觸發 play 的耗時；緩衝延遲是由緩衝區大小推算的名目值，不是實測
+        self.buffer_latency_ms = MIXER_BUFFER / self.frequency * 1000
+        self.dispatch_hist = registry.histogram("sfx.dispatch_ms", DISPATCH_BUCKETS_MS, description="打擊音效觸發")
+        registry.gauge("sfx.buffer_latency_ms", description="音效緩衝延遲估計 (ms)").set(self.buffer_latency_ms)
+
+    def _load_sound(self, path, name):
+        """載入音效檔，失敗時用合成音代替"""
+        if os.path.exists(path):
+            try:
+                return pygame.mixer.Sound(path)
+            except Exception as e:
+                print(f"音效載入失敗: {path} ({e})")
+        return self._synthesize(*self.FALLBACK_TONES[name])
+
+    def _synthesize(self, freq, duration, amplitude):
+        """產生帶衰減包絡的正弦波音效（格式配合目前的 mixer 設定）"""
+        n = int(self.frequency * duration)
+        t = np.arange(n) / self.frequency
+        envelope = np.exp(-t * (6.0 / duration))
+        wave = np.sin(2 * np.pi * freq * t) * envelope * amplitude
+        samples = (wave * 32767).astype(np.int16)
+        if self.mixer_channels > 1:
+            samples = np.repeat(samples[:, None], self.mixer_channels, axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(samples))
+
+    def _pick_channel(self):
+        """優先選閒置的 channel，都在播放時輪流覆蓋最舊的"""
+        for _ in range(len(self.channels)):
+            channel = self.channels[self.next_channel]
+            self.next_channel = (self.next_channel + 1) % len(self.channels)
+            if not channel.get_busy():
+                return channel
+        channel = self.channels[self.next_channel]
+        self.next_channel = (self.next_channel + 1) % len(self.channels)
+        return channel
+
+    def play(self, event):
+        """播放對應事件的音效（'hit' / 'bonus' / 'miss'），立即返回"""
+        sound = self.sounds.get(event)
+        if sound is None:
+            return
+
+        start_time = time.perf_counter()
+        self._pick_channel().play(sound)
+        elapsed = (time.perf_counter() - start_time) * 1000
+
+        self.dispatch_hist.observe(elapsed)
+
+    def get_stats(self):
+        """
+        取得延遲統計
+        est_latency_ms 是估計值：呼叫 play 的耗時 + mixer 緩衝區的名目長度（驅動與硬體的延遲沒有算進去）
+        """
+        avg = self.dispatch_hist.avg
+        return {
+            'play_count': self.dispatch_hist.count,
+            'avg_dispatch_ms': avg,
+            'max_dispatch_ms': self.dispatch_hist.max,
+            'buffer_latency_ms': self.buffer_latency_ms,
+            'est_latency_ms': avg + self.buffer_latency_ms
+        }
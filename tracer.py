@@ -0,0 +1,133 @@
+"""
+Chrome / Perfetto trace 記錄器 - 記錄各執行緒的時間區段，輸出 trace event JSON
+在 chrome://tracing 或 https://ui.perfetto.dev 開啟，即可看到主迴圈、攝影機、姿態、影片、呈現各執行緒的時間軸
+預設關閉；關閉時 span() 只回傳共用的空物件，幾乎沒有成本
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _TraceSpan:
+    __slots__ = ('tracer', 'name', 'args', 'start_ns')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.complete(self.name, self.start_ns, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer:
+    """時間區段記錄器 - 事件存在固定上限的記憶體緩衝區，需要時或程式結束時輸出"""
+
+    def __init__(self, max_events=200000):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)  # 超過上限時丟掉最舊的事件
+        self.pid = os.getpid()
+        self.thread_names = {}
+        self.local = threading.local()
+        self.output_path = None
+        self._atexit_registered = False
+
+    def enable(self, output_path, dump_at_exit=True):
+        """開始記錄；dump_at_exit 為 True 時程式結束自動輸出"""
+        self.output_path = output_path
+        self.enabled = True
+        if dump_at_exit and not self._atexit_registered:
+            atexit.register(self.dump)
+            self._atexit_registered = True
+
+    def set_frame_id(self, frame_id):
+        """設定目前執行緒正在處理的幀 ID，之後的事件都會帶上它"""
+        self.local.frame_id = frame_id
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        return tid
+
+    def span(self, name, **args):
+        """with tracer.span("名稱"): 記錄一個時間區段"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _TraceSpan(self, name, args)
+
+    def complete(self, name, start_ns, end_ns, args=None):
+        """記錄一個已結束的時間區段（perf_counter_ns 時間）"""
+        if not self.enabled:
+            return
+        event_args = dict(args) if args else {}
+        frame_id = getattr(self.local, 'frame_id', None)
+        if frame_id is not None:
+            event_args.setdefault('frame_id', frame_id)
+        self.events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': start_ns / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': self.pid,
+            'tid': self._tid(),
+            'args': event_args
+        })
+
+    def instant(self, name, **args):
+        """記錄一個瞬間事件（例如重複使用舊的姿態結果）"""
+        if not self.enabled:
+            return
+        frame_id = getattr(self.local, 'frame_id', None)
+        if frame_id is not None:
+            args.setdefault('frame_id', frame_id)
+        self.events.append({
+            'name': name,
+            'ph': 'i',
+            's': 't',
+            'ts': time.perf_counter_ns() / 1000,
+            'pid': self.pid,
+            'tid': self._tid(),
+            'args': args
+        })
+
+    def dump(self, path=None):
+        """輸出 Chrome trace JSON，回傳檔案路徑（沒有事件時回傳 None）"""
+        path = path or self.output_path
+        if not path or not self.events:
+            return None
+        events = list(self.events)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self.thread_names.items())
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+        print(f"Trace 已輸出: {path} ({len(events)} 個事件)")
+        return path
+
+
+# 全域共用的 tracer（各執行緒直接 import 使用）
+tracer = Tracer()
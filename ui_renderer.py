@@ -1,44 +1,139 @@
 import cv2
 import numpy as np
+from utils import ui_scale
+
+
+class OverlayLayer:
+    """
+    快取的 RGBA 圖層 - 只記錄有內容的 ROI 區塊
+    不透明區塊（選單方框）直接複製；文字區塊存成預乘 alpha 的 BGR + 反向 alpha，套用時只做兩次小區域運算
+    """
+
+    def __init__(self):
+        self.boxes = []   # (x1, y1, bgr)：不透明區塊
+        self.labels = []  # (x1, y1, premultiplied_bgr, inv_alpha)：半透明文字
+
+    def add_box(self, x1, y1, x2, y2, fill_color, border_color, border=3):
+        """加入實心方框 + 外框（與 cv2.rectangle 畫法相同，外框會往外多畫 border // 2）"""
+        # patch 剛好等於外框的外接範圍，整塊都不透明
+        pad = border // 2
+        bx1, by1 = x1 - pad, y1 - pad
+        patch = np.empty((y2 - y1 + pad * 2 + 1, x2 - x1 + pad * 2 + 1, 3), dtype=np.uint8)
+        cv2.rectangle(patch, (pad, pad), (pad + x2 - x1, pad + y2 - y1), fill_color, -1)
+        cv2.rectangle(patch, (pad, pad), (pad + x2 - x1, pad + y2 - y1), border_color, border)
+        self.boxes.append((bx1, by1, patch))
+
+    def add_text(self, text, org, font, scale, color, thickness, line_type=cv2.LINE_8, shadow_color=None, shadow_offset=3):
+        """加入文字（可選陰影），只在文字外接矩形內存 RGBA"""
+        (tw, th), baseline = cv2.getTextSize(text, font, scale, thickness)
+        margin = thickness + 2
+        extra = shadow_offset if shadow_color is not None else 0
+        x1 = org[0] - margin
+        y1 = org[1] - th - margin
+        w = tw + margin * 2 + extra
+        h = th + baseline + margin * 2 + extra
+
+        # 在透明畫布上畫：顏色通道得到預乘 alpha 的顏色，alpha 通道得到覆蓋率
+        color_canvas = np.zeros((h, w, 3), dtype=np.uint8)
+        alpha = np.zeros((h, w), dtype=np.uint8)
+        local = (org[0] - x1, org[1] - y1)
+        if shadow_color is not None:
+            shadow_org = (local[0] + shadow_offset, local[1] + shadow_offset)
+            cv2.putText(color_canvas, text, shadow_org, font, scale, shadow_color, thickness, line_type)
+            cv2.putText(alpha, text, shadow_org, font, scale, 255, thickness, line_type)
+        cv2.putText(color_canvas, text, local, font, scale, color, thickness, line_type)
+        cv2.putText(alpha, text, local, font, scale, 255, thickness, line_type)
+
+        inv_alpha = cv2.cvtColor(255 - alpha, cv2.COLOR_GRAY2BGR)
+        self.labels.append((x1, y1, color_canvas, inv_alpha))
+
+    @staticmethod
+    def _clip(image, x1, y1, patch):
+        """把 patch 裁切到畫面範圍內，回傳 (畫面 ROI, patch 對應區域的切片)"""
+        ih, iw = image.shape[:2]
+        ph, pw = patch.shape[:2]
+        cx1, cy1 = max(x1, 0), max(y1, 0)
+        cx2, cy2 = min(x1 + pw, iw), min(y1 + ph, ih)
+        if cx1 >= cx2 or cy1 >= cy2:
+            return None, None
+        return (slice(cy1, cy2), slice(cx1, cx2)), (slice(cy1 - y1, cy2 - y1), slice(cx1 - x1, cx2 - x1))
+
+    def apply_boxes(self, image):
+        for x1, y1, patch in self.boxes:
+            roi, local = self._clip(image, x1, y1, patch)
+            if roi is not None:
+                image[roi] = patch[local]
+
+    def apply_labels(self, image):
+        for x1, y1, premultiplied, inv_alpha in self.labels:
+            roi, local = self._clip(image, x1, y1, premultiplied)
+            if roi is None:
+                continue
+            # 結果 = 文字預乘色 + 畫面 × (1 - alpha)
+            target = image[roi]
+            cv2.multiply(target, inv_alpha[local], dst=target, scale=1.0 / 255)
+            cv2.add(target, premultiplied[local], dst=target)
+
 
 class GameUI:
+    # 選單每頁的歌曲數（1080p 版面下方還要留給換頁按鈕）
+    MENU_PAGE_SIZE = 4
+
     def __init__(self, width=640, height=480):
         self.width = width
         self.height = height
+        # 版面以 1920 寬為基準，依內部解析度等比例縮放
+        self.scale = ui_scale(width)
         # === 色彩設定 ===
-        self.COLOR_MENU_BOX = (255, 200, 100)       
-        self.COLOR_MENU_BOX_HOVER = (0, 165, 255)   
+        self.COLOR_MENU_BOX = (255, 200, 100)
+        self.COLOR_MENU_BOX_HOVER = (0, 165, 255)
         self.COLOR_MENU_TEXT = (50, 50, 50)
-        self.mask = None
-        self.mask_inv = None
-        self._init_mask(width, height)
-
-    def _init_mask(self, width, height):
-        self.mask = np.zeros((height, width), dtype=np.uint8)
-        center = (width // 2, height)
-        # 遮罩半徑 = arc_radius + hitbox 容差，確保背景影片剛好在 hitbox 外圈開始
-        arc_radius = int(width * 0.4)
-        hit_tolerance = 80
-        radius = arc_radius + hit_tolerance
-        cv2.circle(self.mask, center, radius, 255, -1)
-        self.mask_inv = cv2.bitwise_not(self.mask)
-        self.mask = cv2.cvtColor(self.mask, cv2.COLOR_GRAY2BGR)
-        self.mask_inv = cv2.cvtColor(self.mask_inv, cv2.COLOR_GRAY2BGR)
+
+        # === 快取圖層：只有內容改變時才重建 ===
+        self._menu_key = None
+        self._menu_layer = None
+        self._menu_regions = []
+        self._result_key = None
+        self._result_layer = None
+        self._result_btn = None
+
+    def _px(self, value):
+        """把 1920 寬基準下的像素值換算成目前解析度"""
+        return int(round(value * self.scale))
+
+    def _thickness(self, value):
+        return max(1, self._px(value))
 
     # === [新增] FPS 繪製 ===
     def draw_fps(self, image, fps):
         # 顯示在左下角
-        cv2.putText(image, f"FPS: {int(fps)}", (20, self.height - 20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.putText(image, f"FPS: {int(fps)}", (self._px(20), self.height - self._px(20)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7 * self.scale, (0, 255, 0), self._thickness(2))
 
-    def draw_menu(self, image, song_list, hover_index, hover_progress, fps=0):
-        h, w = image.shape[:2]
-        cv2.putText(image, "Select Song", (50, 100), cv2.FONT_HERSHEY_DUPLEX, 2.0, (255, 255, 255), 3)
-        cv2.putText(image, "Hover 3 seconds to start", (55, 150), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2)
+    def _add_button(self, layer, label, x, y, btn_w, btn_h, is_hover):
+        """選單上的小按鈕（換頁、難度），文字置中"""
+        color = self.COLOR_MENU_BOX_HOVER if is_hover else self.COLOR_MENU_BOX
+        layer.add_box(x, y, x + btn_w, y + btn_h, color, (255, 255, 255), self._thickness(3))
+        thickness = self._thickness(2)
+        text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 1.0 * self.scale, thickness)[0]
+        text_org = (x + (btn_w - text_size[0]) // 2, y + (btn_h + text_size[1]) // 2)
+        layer.add_text(label, text_org, cv2.FONT_HERSHEY_SIMPLEX, 1.0 * self.scale, self.COLOR_MENU_TEXT, thickness, cv2.LINE_AA)
+        return (x, y, x + btn_w, y + btn_h)
+
+    def _build_menu_layer(self, w, song_list, hover_index, page, page_count, difficulty):
+        """
+        建立選單圖層（標題、方框、歌名、換頁與難度按鈕），回傳 (圖層, 方框區域)
+        方框區域依序為這一頁的歌曲，有多頁時再加上「上一頁」、「下一頁」，有難度時最後是難度按鈕
+        """
+        layer = OverlayLayer()
+        px = self._px
+        layer.add_text("Select Song", (px(50), px(100)), cv2.FONT_HERSHEY_DUPLEX, 2.0 * self.scale, (255, 255, 255), self._thickness(3))
+        layer.add_text("Hover 3 seconds to start", (px(55), px(150)), cv2.FONT_HERSHEY_SIMPLEX, 1.0 * self.scale, (200, 200, 200), self._thickness(2))
 
-        start_y = 250
-        box_height = 120
-        gap = 40
+        start_y = px(250)
+        box_height = px(120)
+        gap = px(40)
+        text_thickness = self._thickness(3)
         box_width = int(w * 0.6)
         box_x = int((w - box_width) / 2)
 
@@ -47,64 +142,113 @@ class GameUI:
             y = start_y + i * (box_height + gap)
             is_hover = (i == hover_index)
             color = self.COLOR_MENU_BOX_HOVER if is_hover else self.COLOR_MENU_BOX
-            cv2.rectangle(image, (box_x, y), (box_x + box_width, y + box_height), color, -1)
-            cv2.rectangle(image, (box_x, y), (box_x + box_width, y + box_height), (255, 255, 255), 3)
-            if is_hover and hover_progress > 0:
-                progress_w = int(box_width * hover_progress)
-                cv2.rectangle(image, (box_x, y), (box_x + progress_w, y + box_height), (0, 255, 0), -1)
-            
-            font_scale = 1.2
-            text = f"{i+1}. {song['name']} ({song['bpm']} BPM)"
-            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 3)[0]
-            text_x = box_x + 30
+            layer.add_box(box_x, y, box_x + box_width, y + box_height, color, (255, 255, 255), self._thickness(3))
+
+            font_scale = 1.2 * self.scale
+            text = f"{page * self.MENU_PAGE_SIZE + i + 1}. {song['name']} ({song['bpm']} BPM)"
+            if song.get('difficulty'):
+                text += f" [{song['difficulty'].upper()}]"
+            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_thickness)[0]
+            text_x = box_x + px(30)
             text_y = y + int((box_height + text_size[1]) / 2)
-            cv2.putText(image, text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, self.COLOR_MENU_TEXT, 3, cv2.LINE_AA)
+            layer.add_text(text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, self.COLOR_MENU_TEXT, text_thickness, cv2.LINE_AA)
             box_regions.append((box_x, y, box_x + box_width, y + box_height))
-        
-        self.draw_fps(image, fps)
-        return box_regions
 
-    def draw_result_panel(self, image, stats, hover_progress, fps=0):
+        if page_count > 1:
+            nav_y = start_y + self.MENU_PAGE_SIZE * (box_height + gap)
+            nav_w, nav_h = px(300), px(100)
+            for j, (label, nav_x) in enumerate((("< PREV", box_x), ("NEXT >", box_x + box_width - nav_w))):
+                is_hover = (len(song_list) + j == hover_index)
+                box_regions.append(self._add_button(layer, label, nav_x, nav_y, nav_w, nav_h, is_hover))
+            self._add_centered_text(layer, f"Page {page + 1} / {page_count}", w // 2, nav_y + nav_h // 2, 1.0, (255, 255, 255))
+
+        if difficulty is not None:
+            # 難度按鈕在標題右側（與歌曲方框右緣對齊）
+            btn_w, btn_h = px(420), px(100)
+            is_hover = (len(box_regions) == hover_index)
+            box_regions.append(self._add_button(layer, f"LEVEL: {difficulty.upper()}", box_x + box_width - btn_w, px(60),
+                                                btn_w, btn_h, is_hover))
+        return layer, box_regions
+
+    def draw_menu(self, image, song_list, hover_index, hover_progress, fps=0, page=0, page_count=1, difficulty=None):
+        """
+        song_list 為目前這一頁的歌曲（最多 MENU_PAGE_SIZE 首）
+        回傳方框區域：這一頁的歌曲，有多頁時再加上上一頁 / 下一頁按鈕，difficulty 不為 None 時最後是難度按鈕
+        """
         h, w = image.shape[:2]
+        key = (w, h, hover_index, page, page_count, difficulty,
+               tuple((song['name'], song['bpm'], song.get('difficulty')) for song in song_list))
+        if key != self._menu_key:
+            self._menu_layer, self._menu_regions = self._build_menu_layer(w, song_list, hover_index, page, page_count,
+                                                                          difficulty)
+            self._menu_key = key
+
+        # 方框 → 每幀變動的進度條 → 文字
+        self._menu_layer.apply_boxes(image)
+        if 0 <= hover_index < len(self._menu_regions) and hover_progress > 0:
+            x1, y1, x2, y2 = self._menu_regions[hover_index]
+            progress_w = int((x2 - x1) * hover_progress)
+            cv2.rectangle(image, (x1, y1), (x1 + progress_w, y2), (0, 255, 0), -1)
+        self._menu_layer.apply_labels(image)
+
+        self.draw_fps(image, fps)
+        return self._menu_regions
+
+    def _build_result_layer(self, w, h, stats, is_hover):
+        """建立結算圖層（標題、統計、按鈕），回傳 (圖層, 按鈕區域)"""
+        layer = OverlayLayer()
         center_x = w // 2
-        overlay = image.copy()
-        cv2.rectangle(overlay, (0, 0), (w, h), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.85, image, 0.15, 0, image)
-        
-        self._draw_centered_text(image, "GAME OVER", center_x, 150, 3.0, (0, 255, 255))
-        start_y = 300
-        gap = 80
+        px = self._px
+
+        self._add_centered_text(layer, "GAME OVER", center_x, px(150), 3.0, (0, 255, 255))
+        start_y = px(300)
+        gap = px(80)
         items = [("TOTAL BALLS", stats['total']), ("HIT", stats['hit']), ("MISS", stats['miss']), ("MAX COMBO", stats['combo']), ("SCORE", stats['score'])]
         for i, (label, value) in enumerate(items):
             y = start_y + i * gap
             color = (255, 255, 255)
             if label == "SCORE": color = (0, 215, 255)
             if label == "MISS":  color = (100, 100, 255)
-            self._draw_centered_text(image, f"{label}: {value}", center_x, y, 1.5, color)
-        
-        btn_w, btn_h = 400, 100
+            self._add_centered_text(layer, f"{label}: {value}", center_x, y, 1.5, color)
+
+        btn_w, btn_h = px(400), px(100)
         btn_x = center_x - btn_w // 2
-        btn_y = h - 200
-        color = self.COLOR_MENU_BOX_HOVER if hover_progress > 0 else self.COLOR_MENU_BOX
-        cv2.rectangle(image, (btn_x, btn_y), (btn_x + btn_w, btn_y + btn_h), color, -1)
-        cv2.rectangle(image, (btn_x, btn_y), (btn_x + btn_w, btn_y + btn_h), (255, 255, 255), 3)
-        if hover_progress > 0:
-            prog_w = int(btn_w * hover_progress)
-            cv2.rectangle(image, (btn_x, btn_y), (btn_x + prog_w, btn_y + btn_h), (0, 255, 0), -1)
+        btn_y = h - px(200)
+        color = self.COLOR_MENU_BOX_HOVER if is_hover else self.COLOR_MENU_BOX
+        layer.add_box(btn_x, btn_y, btn_x + btn_w, btn_y + btn_h, color, (255, 255, 255), self._thickness(3))
         text = "MAIN MENU"
-        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 1.5, 3)[0]
+        thickness = self._thickness(3)
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 1.5 * self.scale, thickness)[0]
         text_x = btn_x + (btn_w - text_size[0]) // 2
         text_y = btn_y + (btn_h + text_size[1]) // 2
-        cv2.putText(image, text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 1.5, self.COLOR_MENU_TEXT, 3, cv2.LINE_AA)
-        
+        layer.add_text(text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 1.5 * self.scale, self.COLOR_MENU_TEXT, thickness, cv2.LINE_AA)
+        return layer, (btn_x, btn_y, btn_x + btn_w, btn_y + btn_h)
+
+    def draw_result_panel(self, image, stats, hover_progress, fps=0):
+        h, w = image.shape[:2]
+        # 背景變暗：原本是與全黑畫面以 0.85 混合，等同於直接乘上 0.15（單次原地運算）
+        cv2.convertScaleAbs(image, image, 0.15)
+
+        key = (w, h, hover_progress > 0, tuple(sorted(stats.items())))
+        if key != self._result_key:
+            self._result_layer, self._result_btn = self._build_result_layer(w, h, stats, hover_progress > 0)
+            self._result_key = key
+
+        self._result_layer.apply_boxes(image)
+        if hover_progress > 0:
+            btn_x, btn_y, btn_x2, btn_y2 = self._result_btn
+            prog_w = int((btn_x2 - btn_x) * hover_progress)
+            cv2.rectangle(image, (btn_x, btn_y), (btn_x + prog_w, btn_y2), (0, 255, 0), -1)
+        self._result_layer.apply_labels(image)
+
         self.draw_fps(image, fps)
-        return (btn_x, btn_y, btn_x + btn_w, btn_y + btn_h)
+        return self._result_btn
 
-    def _draw_centered_text(self, image, text, cx, cy, scale, color):
-        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 3)[0]
+    def _add_centered_text(self, layer, text, cx, cy, scale, color):
+        """scale 為 1920 寬基準下的字體大小"""
+        scale *= self.scale
+        thickness = self._thickness(3)
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)[0]
         tx = cx - text_size[0] // 2
-        self._draw_shadow_text(image, text, (tx, cy), scale, color, thickness=3)
-
-    def _draw_shadow_text(self, image, text, pos, scale, color, thickness=2):
-        cv2.putText(image, text, (pos[0]+3, pos[1]+3), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), thickness, cv2.LINE_AA)
-        cv2.putText(image, text, pos, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness, cv2.LINE_AA)
\ No newline at end of file
+        layer.add_text(text, (tx, cy), cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness, cv2.LINE_AA,
+                       shadow_color=(0, 0, 0), shadow_offset=max(1, self._px(3)))
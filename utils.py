@@ -1,4 +1,21 @@
+import sys
 import time
+import json
+import math
+import threading
+import tracemalloc
+from array import array
+from tracer import tracer
+from metrics import gc_thread_totals
+
+
+# 幾何與版面以 1920 寬為基準設計；其他內部解析度依寬度等比例縮放
+REFERENCE_WIDTH = 1920
+
+
+def ui_scale(width):
+    """回傳相對於 1920 寬基準的縮放倍率"""
+    return width / REFERENCE_WIDTH
 
 
 class FPSCounter:
@@ -24,60 +41,331 @@ def is_hand_in_box(hand_pos, box_rect):
     return x1 <= x <= x2 and y1 <= y <= y2
 
 
+class _RingBuffer:
+    """固定大小的環狀緩衝區 - 只保留最近 size 筆數值，記憶體不會隨時間成長"""
+    
+    __slots__ = ('values', 'size', 'index', 'count')
+    
+    def __init__(self, size):
+        self.values = array('d', [0.0]) * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+    
+    def append(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+    
+    def snapshot(self):
+        """回傳目前有效的數值（未排序）"""
+        if self.count < self.size:
+            return self.values[:self.count].tolist()
+        return self.values.tolist()
+
+
+def _percentile(sorted_values, pct):
+    """最近排名法百分位數（sorted_values 需已排序且非空）"""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _NullSpan:
+    """停用時的 span：什麼都不做"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """with profiler.span("步驟"): 形式的計時區段"""
+    
+    __slots__ = ('profiler', 'name')
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.profiler.start(self.name)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.end()
+        return False
+
+
+class _GateWork:
+    """背景執行緒的一輪工作：閘門關閉時先停在外面"""
+    
+    __slots__ = ('gate',)
+    
+    def __init__(self, gate):
+        self.gate = gate
+    
+    def __enter__(self):
+        gate = self.gate
+        with gate.cond:
+            while gate.closed:
+                gate.cond.wait()
+            gate.active += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        gate = self.gate
+        with gate.cond:
+            gate.active -= 1
+            if gate.active == 0:
+                gate.cond.notify_all()
+        return False
+
+
+class ProfileGate:
+    """
+    配置分析用的閘門 - tracemalloc 與 sys.getallocatedblocks 都是整個行程的數字，
+    分析中的步驟執行期間讓背景執行緒停在自己的工作區段外，量到的配置才只屬於這個步驟
+    背景執行緒以 with profile_gate.work(): 包住每一輪的工作；不能包住等待其他執行緒的部分，否則會互等
+    只在 StepProfiler 開啟配置分析時啟用，平常 work() 直接返回
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.cond = threading.Condition()
+        self.closed = False
+        self.active = 0    # 正在工作區段內的背景執行緒數
+        self.owner = None  # 關閉閘門的執行緒（它自己呼叫 work() 時不擋）
+    
+    def work(self):
+        if not self.enabled or self.owner == threading.get_ident():
+            return _NULL_SPAN
+        return _GateWork(self)
+    
+    def close(self, timeout=1.0):
+        """關閉閘門並等背景執行緒離開工作區段；逾時回傳 False（這次量測會混到其他執行緒）"""
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            self.closed = True
+            self.owner = threading.get_ident()
+            while self.active > 0:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.cond.wait(remaining):
+                    return self.active == 0
+            return True
+    
+    def open(self):
+        with self.cond:
+            self.closed = False
+            self.owner = None
+            self.cond.notify_all()
+
+
+# 全域閘門（各背景執行緒直接 import 使用）
+profile_gate = ProfileGate()
+
+
 class StepProfiler:
-    """步驟計時器 - 用於分析各步驟耗時找出 bottleneck"""
+    """
+    步驟計時器 - 用於分析各步驟耗時找出 bottleneck
+    使用 perf_counter_ns 計時，每個步驟保留最近 window 筆在環狀緩衝區，報告 p50/p95/p99/max
+    支援巢狀計時：在「遊戲邏輯」裡再 start("音效") 會記成「遊戲邏輯/音效」
+    track_allocations=True 時另外以 tracemalloc 統計每個步驟的配置量、記憶體區塊數與 GC 次數/暫停
+    配置量是整個行程的數字（包含背景執行緒）；isolate_threads=True（預設關閉）時最外層步驟執行期間
+    以 profile_gate 暫停背景執行緒的 CPU 工作，數字才只屬於這個步驟（會改變執行緒時序，各步驟耗時也會變長）
+    GC 只計入本執行緒觸發的回收（來自 metrics.GCMonitor）
+    tracemalloc 會明顯拖慢執行，只在檢查配置時開啟
+    """
     
-    def __init__(self, enabled=True, print_interval=60):
+    def __init__(self, enabled=True, print_interval=60, window=600, json_path=None, track_allocations=False,
+                 top_sites=10, isolate_threads=False):
         self.enabled = enabled
         self.print_interval = print_interval  # 每幾幀輸出一次
+        self.window = window                  # 每個步驟保留的樣本數
+        self.json_path = json_path            # 若設定，每次報告都以 JSON Lines 附加寫入
         self.frame_count = 0
-        self.step_times = {}
-        self.step_start = None
-        self.current_step = None
+        self.total_frames = 0
+        self.steps = {}
+        self.stack = []
+        
+        # 配置統計：{步驟: [次數, 峰值增量, 淨增量, 淨區塊數, GC 次數, GC 暫停 ms]}，每次報告後清空
+        self.track_allocations = enabled and track_allocations
+        self.top_sites = top_sites
+        self.alloc = {}
+        self.last_snapshot = None
+        self.isolate_threads = self.track_allocations and isolate_threads
+        self.isolation_misses = 0  # 背景執行緒沒能及時暫停的次數（這些樣本混到其他執行緒的配置）
+        if self.track_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            profile_gate.enabled = self.isolate_threads
     
     def start(self, step_name):
-        """開始計時某個步驟"""
+        """開始計時某個步驟（可巢狀）"""
         if not self.enabled:
             return
-        self.current_step = step_name
-        self.step_start = time.time()
+        if self.stack:
+            step_name = self.stack[-1][0] + "/" + step_name
+        if self.track_allocations:
+            if self.isolate_threads and not self.stack and not profile_gate.close():
+                self.isolation_misses += 1
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                # reset_peak 之後就看不到上層步驟到目前為止的峰值，先記下來
+                parent = self.stack[-1]
+                parent[3] = max(parent[3], peak)
+            tracemalloc.reset_peak()
+            gc_count, gc_ms = gc_thread_totals()
+            self.stack.append([step_name, time.perf_counter_ns(), current, current, sys.getallocatedblocks(),
+                               gc_count, gc_ms])
+        else:
+            self.stack.append((step_name, time.perf_counter_ns()))
     
     def end(self):
-        """結束當前步驟計時"""
-        if not self.enabled or self.step_start is None:
+        """結束最內層步驟計時"""
+        if not self.enabled or not self.stack:
             return
-        elapsed = (time.time() - self.step_start) * 1000  # 轉成毫秒
-        if self.current_step not in self.step_times:
-            self.step_times[self.current_step] = []
-        self.step_times[self.current_step].append(elapsed)
-        self.step_start = None
+        end_ns = time.perf_counter_ns()
+        entry = self.stack.pop()
+        step_name, start_ns = entry[0], entry[1]
+        if self.track_allocations:
+            self._record_allocations(entry)
+            if self.isolate_threads and not self.stack:
+                profile_gate.open()
+        ring = self.steps.get(step_name)
+        if ring is None:
+            ring = self.steps[step_name] = _RingBuffer(self.window)
+        ring.append((end_ns - start_ns) / 1e6)  # 轉成毫秒
+        # 同一段時間也送進 trace（tracer 關閉時直接返回）
+        tracer.complete(step_name, start_ns, end_ns)
+    
+    def _record_allocations(self, entry):
+        """累計一個步驟的配置量（峰值增量 ≈ 步驟內配置後又釋放的暫存量）"""
+        current, peak = tracemalloc.get_traced_memory()
+        step_name, _, start_bytes, parent_peak, start_blocks, start_gc, start_pause = entry
+        acc = self.alloc.get(step_name)
+        if acc is None:
+            acc = self.alloc[step_name] = [0, 0, 0, 0, 0, 0.0]
+        acc[0] += 1
+        acc[1] += max(peak, parent_peak) - start_bytes
+        acc[2] += current - start_bytes
+        acc[3] += sys.getallocatedblocks() - start_blocks
+        gc_count, gc_ms = gc_thread_totals()
+        acc[4] += gc_count - start_gc
+        acc[5] += gc_ms - start_pause
+    
+    def span(self, step_name):
+        """context manager 形式：with profiler.span("步驟"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, step_name)
     
     def frame_done(self):
         """一幀結束，檢查是否需要輸出報告"""
         if not self.enabled:
             return
         self.frame_count += 1
+        self.total_frames += 1
         if self.frame_count >= self.print_interval:
             self.print_report()
+            if self.json_path:
+                self.write_json(self.json_path)
             self.reset()
     
+    def report(self):
+        """回傳機器可讀的統計：{步驟: {count, avg_ms, p50_ms, p95_ms, p99_ms, max_ms}}"""
+        steps = {}
+        for step, ring in self.steps.items():
+            values = sorted(ring.snapshot())
+            if not values:
+                continue
+            steps[step] = {
+                'count': len(values),
+                'avg_ms': sum(values) / len(values),
+                'p50_ms': _percentile(values, 50),
+                'p95_ms': _percentile(values, 95),
+                'p99_ms': _percentile(values, 99),
+                'max_ms': values[-1],
+            }
+        for step, acc in self.alloc.items():
+            if step not in steps or acc[0] == 0:
+                continue
+            count = acc[0]
+            steps[step]['alloc'] = {
+                'calls': count,
+                'peak_kb': acc[1] / count / 1024,
+                'net_kb': acc[2] / count / 1024,
+                'net_blocks': acc[3] / count,
+                'gc_collections': acc[4],
+                'gc_pause_ms': acc[5],
+                'threads_isolated': self.isolate_threads,
+            }
+        return {'time': time.time(), 'frame': self.total_frames, 'steps': steps}
+    
+    def write_json(self, path):
+        """把目前的統計以一行 JSON 附加到檔案"""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.report(), ensure_ascii=False) + "\n")
+    
     def print_report(self):
         """輸出耗時報告"""
-        print("\n" + "="*50)
-        print(f"⏱️  步驟耗時分析 (過去 {self.frame_count} 幀平均值)")
-        print("="*50)
+        steps = self.report()['steps']
+        print("\n" + "="*78)
+        print(f"⏱️  步驟耗時分析 (最近 {self.window} 筆)")
+        print("="*78)
+        print(f"{'步驟':20s}  {'平均':>7s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'max':>7s} (ms)")
         total = 0
-        for step, times in self.step_times.items():
-            avg = sum(times) / len(times)
-            total += avg
-            bar = "█" * int(avg / 2)  # 視覺化長條
-            print(f"{step:20s}: {avg:6.2f} ms {bar}")
-        print("-"*50)
-        print(f"{'總計':20s}: {total:6.2f} ms (≈ {1000/total:.1f} FPS)")
-        print("="*50 + "\n")
+        for step, st in steps.items():
+            # 巢狀步驟已包含在上層步驟裡，不重複加總
+            if "/" not in step:
+                total += st['avg_ms']
+            bar = "█" * int(st['p95_ms'] / 2)  # 視覺化長條（以 p95）
+            print(f"{step:20s}: {st['avg_ms']:7.2f} {st['p50_ms']:7.2f} {st['p95_ms']:7.2f} "
+                  f"{st['p99_ms']:7.2f} {st['max_ms']:7.2f} {bar}")
+        print("-"*78)
+        fps = 1000 / total if total > 0 else 0
+        print(f"{'總計':20s}: {total:7.2f} ms (≈ {fps:.1f} FPS)")
+        if self.track_allocations:
+            self._print_allocations(steps)
+        print("="*78 + "\n")
+    
+    def _print_allocations(self, steps):
+        """輸出每個步驟每次呼叫的平均配置量，以及記憶體淨增加最多的程式位置"""
+        print("-"*78)
+        if self.isolate_threads:
+            scope = f"背景執行緒已暫停，未及時暫停 {self.isolation_misses} 次"
+        else:
+            scope = "整個行程，含背景執行緒同時間的配置"
+        print(f"{'步驟':20s}  {'峰值KB':>8s} {'淨KB':>8s} {'區塊':>7s} {'GC次數':>6s} {'GC ms':>7s}"
+              f"  (KB、區塊為每次平均；GC 為本執行緒觸發的區間總計)")
+        print(f"配置量範圍：{scope}")
+        for step, st in steps.items():
+            alloc = st.get('alloc')
+            if alloc is None:
+                continue
+            print(f"{step:20s}: {alloc['peak_kb']:8.1f} {alloc['net_kb']:8.1f} {alloc['net_blocks']:7.1f} "
+                  f"{alloc['gc_collections']:6d} {alloc['gc_pause_ms']:7.2f}")
+        
+        # 與上次報告的快照比較（take_snapshot 很慢，只在報告時做）
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        if self.last_snapshot is not None and self.top_sites:
+            print("-"*78)
+            print(f"記憶體淨增加最多的 {self.top_sites} 個位置：")
+            for stat in snapshot.compare_to(self.last_snapshot, 'lineno')[:self.top_sites]:
+                print(f"  {stat}")
+        self.last_snapshot = snapshot
     
     def reset(self):
-        """重置計數"""
+        """重置幀計數與配置統計（環狀緩衝區保留，百分位數是滾動視窗）"""
         self.frame_count = 0
-        self.step_times = {}
-
+        self.alloc = {}
+        self.isolation_misses = 0
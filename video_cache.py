@@ -0,0 +1,188 @@
+"""
+背景影片幀快取 - 把影片在目標解析度下解碼一次，存成 memory-mapped raw 檔
+之後播放只需從 np.memmap 取切片，不必再佔用一個解碼核心
+快取以「來源檔路徑 + mtime + 大小 + 解析度」為 key（不讀取影片內容），超過磁碟預算時依最久未使用 (LRU) 淘汰
+背景影片只以 30% 混合，快取以縮小的解析度（寬度上限 max_width）儲存，播放時再放大：
+640x360 每幀約 0.69 MB，8 GB 預算可存約 11900 幀（30 fps 約 6.6 分鐘）；超過預算的影片不快取
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import cv2
+
+
+class _CacheWriter:
+    """第一次播放時把解碼好的幀依序寫入暫存檔，整部影片寫完才登記到索引"""
+
+    def __init__(self, cache, key, width, height, fps):
+        self.cache = cache
+        self.key = key
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = 0
+        self.frame_bytes = width * height * 3
+        # 每個寫入者使用自己的暫存檔：同一部影片可能同時有被取消的預載與新的播放在寫
+        fd, self.part_path = tempfile.mkstemp(dir=cache.cache_dir, prefix=key + ".", suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, frame):
+        """寫入一幀（縮放到快取解析度）；超過磁碟預算時回傳 False 並放棄快取"""
+        if (self.frame_count + 1) * self.frame_bytes > self.cache.budget_bytes:
+            print(f"影片超過快取預算 ({self.cache.budget_bytes // 1024 ** 2} MB)，不快取: {self.key}")
+            self.abort()
+            return False
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.frame_count += 1
+        return True
+
+    def commit(self):
+        """影片完整寫完：改名為正式檔並登記索引；失敗時回傳 False"""
+        self.file.close()
+        return self.cache._commit(self)
+
+    def abort(self):
+        """放棄寫入（中途停止或超過預算）"""
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+
+class VideoFrameCache:
+    """影片幀快取管理 - 索引存在 cache_dir/index.json"""
+
+    def __init__(self, cache_dir, budget_bytes=8 * 1024 ** 3, max_width=640):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.max_width = max_width  # 快取幀的寬度上限（依比例縮小高度）
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.open_counts = {}  # key -> 目前 memmap 著這個快取的播放器數量（淘汰時略過）
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'entries': {}}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {'entries': {}}
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _raw_path(self, key):
+        return os.path.join(self.cache_dir, key + ".raw")
+
+    def cache_size(self, size):
+        """輸出尺寸對應的快取儲存尺寸（寬度不超過 max_width，保持比例，偶數像素）"""
+        w, h = size
+        if w <= self.max_width:
+            return (w, h)
+        return (self.max_width, max(2, int(round(h * self.max_width / w)) // 2 * 2))
+
+    def make_key(self, video_path, size):
+        """快取 key = 來源檔（絕對路徑 + mtime + 大小）的雜湊 + 快取解析度；只 stat 不讀檔，影片換掉時 key 跟著變"""
+        stat = os.stat(video_path)
+        source = f"{os.path.abspath(video_path)}|{stat.st_mtime}|{stat.st_size}"
+        w, h = size
+        return f"{hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]}_{w}x{h}"
+
+    def open(self, key):
+        """
+        開啟已快取的影片，回傳 (memmap 陣列 [幀, 高, 寬, 3], fps)
+        沒有快取時回傳 (None, None)；開啟成功後用完要呼叫 release(key)
+        """
+        with self.lock:
+            entry = self.index['entries'].get(key)
+            path = self._raw_path(key)
+            if entry is None or not os.path.exists(path):
+                return None, None
+            # last_used 只更新記憶體，release() 時才寫回索引（開啟時不寫檔）
+            entry['last_used'] = time.time()
+            # 在鎖內登記，避免開啟途中被其他播放器的 _commit 淘汰
+            self.open_counts[key] = self.open_counts.get(key, 0) + 1
+
+        try:
+            frames = np.memmap(path, dtype=np.uint8, mode='r',
+                               shape=(entry['frame_count'], entry['height'], entry['width'], 3))
+        except (OSError, ValueError):
+            self.release(key)
+            return None, None
+        return frames, entry['fps']
+
+    def release(self, key):
+        """播放器不再使用 open() 取得的 memmap；順便把 last_used 寫回索引"""
+        with self.lock:
+            count = self.open_counts.get(key, 0) - 1
+            if count > 0:
+                self.open_counts[key] = count
+            else:
+                self.open_counts.pop(key, None)
+            if key in self.index['entries']:
+                try:
+                    self._save_index()
+                except OSError as e:
+                    print(f"影片快取索引寫入失敗: {e}")
+
+    def begin(self, key, width, height, fps, frame_count_estimate=0):
+        """開始建立快取；預估大小超過預算時回傳 None（不快取這部影片）"""
+        if frame_count_estimate > 0 and frame_count_estimate * width * height * 3 > self.budget_bytes:
+            return None
+        return _CacheWriter(self, key, width, height, fps)
+
+    def _commit(self, writer):
+        size_bytes = writer.frame_count * writer.frame_bytes
+        with self.lock:
+            try:
+                os.replace(writer.part_path, self._raw_path(writer.key))
+            except OSError as e:
+                # 例如另一個播放器正 memmap 著同一個 key（Windows 無法覆蓋）：放棄這次寫入
+                print(f"影片快取寫入失敗: {e}")
+                writer.abort()
+                return False
+            self.index['entries'][writer.key] = {
+                'frame_count': writer.frame_count,
+                'width': writer.width,
+                'height': writer.height,
+                'fps': writer.fps,
+                'size_bytes': size_bytes,
+                'last_used': time.time()
+            }
+            self._evict(keep=writer.key)
+            self._save_index()
+        return True
+
+    def _evict(self, keep):
+        """依最久未使用順序刪除快取，直到總大小不超過預算"""
+        entries = self.index['entries']
+        total = sum(e['size_bytes'] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.budget_bytes:
+                break
+            if key == keep or self.open_counts.get(key, 0) > 0:
+                # 還有播放器 memmap 著，等它釋放後下次再清
+                continue
+            try:
+                path = self._raw_path(key)
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                continue
+            total -= entries.pop(key)['size_bytes']
+            print(f"影片快取淘汰: {key}")
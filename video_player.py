@@ -1,81 +1,263 @@
 import cv2
 import time
 import threading
+from collections import deque
+from tracer import tracer
+from metrics import registry
+from utils import profile_gate
 
 
 class VideoPlayerThread:
-    """背景影片多執行緒播放器 - 在背景持續讀取影片幀"""
-    
-    def __init__(self, video_path):
+    """
+    背景影片多執行緒播放器 - 在背景解碼並縮放影片幀
+    解碼好的幀連同播放時間戳 (pts) 放進小型佇列，主執行緒依音樂時鐘挑選對應的幀
+    若提供 VideoFrameCache，第一輪解碼時同時寫入快取，之後改從 memmap 取幀不再解碼
+    （快取幀解析度較低，放大到輸出尺寸同樣在背景執行緒完成）
+    """
+
+    def __init__(self, video_path, output_size=None, queue_size=4, cache=None):
+        self.video_path = video_path
+        self.output_size = output_size  # (寬, 高)；None 代表維持原尺寸
         self.cap = cv2.VideoCapture(video_path)
         self.fps = self.cap.get(cv2.CAP_PROP_FPS)
         if self.fps <= 0 or self.fps > 120:
             self.fps = 30
+
+        # 幀快取：命中時 cached_frames 為 memmap（縮小解析度），完全不需要解碼
+        self.cache = cache
+        self.cache_writer = None
+        self.cache_key = None
+        self.cached_frames = None
+        if cache is not None:
+            self._open_cache(cache)
         self.frame_duration = 1.0 / self.fps
-        
-        self.grabbed, self.frame = self.cap.read()
+
+        # 幀佇列：(pts 秒, frame)，解碼執行緒最多領先 queue_size 幀
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.loop_offset = 0.0      # 目前這一輪播放的起始 pts（循環播放時累加）
+        self.loop_frame_index = 0   # 這一輪已解碼的幀數
+        self.last_clock = 0.0       # 主執行緒最近一次要求的時間
+        self.frame_step = 1         # 每幾幀解碼一幀，其餘只 grab（畫質調節用）
+        self.start_time = None
+        self.thread = None
+
         self.stopped = False
         self.frame_available = True
+        self.frame = None
+        self.frame_pts = 0.0  # 目前顯示幀的 pts
+        if self.cached_frames is not None:
+            # 複製一份，畫面不持有 memmap 切片
+            self.grabbed, frame = True, self.cached_frames[0].copy()
+        else:
+            self.grabbed, frame = self.cap.read()
         if not self.grabbed:
             print(f"無法讀取背景影片: {video_path}")
             self.frame_available = False
-        
+        else:
+            self.frame = self._resize(frame)
+            self.queue.append((0.0, self.frame))
+            self.loop_frame_index = 1
+            self._write_cache(self.frame)
+
         # 計時與追蹤
         self.frame_id = 0
         self.last_read_time = 0
-        self.read_count = 0
-        self.total_read_time = 0
-        self.lock = threading.Lock()
+        self.read_hist = registry.histogram("video.read_ms", description="影片解碼")
+        self.dropped_counter = registry.counter("video.dropped", description="影片跳過幀")      # 因落後音樂時鐘而跳過的幀
+        self.repeated_counter = registry.counter("video.repeated", description="影片重複幀")  # 因解碼來不及而重複顯示的次數
+
+    def _open_cache(self, cache):
+        """查詢幀快取；沒有命中就準備在第一輪播放時建立"""
+        if self.output_size is not None:
+            size = self.output_size
+        else:
+            size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if size[0] <= 0 or size[1] <= 0:
+            return
+        cache_w, cache_h = cache.cache_size(size)
+        self.cache_key = cache.make_key(self.video_path, (cache_w, cache_h))
+        frames, fps = cache.open(self.cache_key)
+        if frames is not None and len(frames) > 0:
+            print(f"背景影片使用快取: {self.cache_key}")
+            self.cached_frames = frames
+            self.fps = fps
+            self.cap.release()
+            return
+        frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.cache_writer = cache.begin(self.cache_key, cache_w, cache_h, self.fps, frame_count)
+        if self.cache_writer is None and frame_count > 0:
+            print(f"背景影片超過快取預算，不快取: {self.video_path}")
+
+    def _write_cache(self, frame):
+        if self.cache_writer is not None and not self.cache_writer.write(frame):
+            self.cache_writer = None
+
+    def _finish_cache(self):
+        """第一輪解碼完成：登記快取，之後的循環改從 memmap 取幀"""
+        writer = self.cache_writer
+        self.cache_writer = None
+        if not writer.commit():
+            return False
+        frames, _ = self.cache.open(self.cache_key)
+        if frames is None:
+            return False
+        with self.lock:
+            self.cached_frames = frames
+        self.cap.release()
+        return True
+
+    def _resize(self, frame):
+        """在背景執行緒縮放到輸出尺寸，避免主執行緒每幀 resize"""
+        if self.output_size is None:
+            return frame
+        w, h = self.output_size
+        if frame.shape[1] != w or frame.shape[0] != h:
+            frame = cv2.resize(frame, (w, h))
+        return frame
 
     def start(self):
+        self.start_time = time.time()
+        # 快取命中時執行緒不解碼，只負責把快取幀放大到輸出尺寸
         if self.frame_available:
-            threading.Thread(target=self.update, args=(), daemon=True).start()
+            self.thread = threading.Thread(target=self.update, args=(), daemon=True, name="VideoPlayer")
+            self.thread.start()
         return self
 
+    def _next_pts(self):
+        return self.loop_offset + self.loop_frame_index * self.frame_duration
+
     def update(self):
         while not self.stopped:
-            start_time = time.time()
-            grabbed, frame = self.cap.read()
-            
-            if not grabbed:
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-            
-            read_elapsed = (time.time() - start_time) * 1000
-            
-            with self.lock:
-                self.grabbed = grabbed
-                self.frame = frame
-                self.frame_id += 1
-                self.last_read_time = read_elapsed
-                self.read_count += 1
-                self.total_read_time += read_elapsed
-            
-            # 控制播放速度
-            elapsed = time.time() - start_time
-            wait_time = self.frame_duration - elapsed
-            if wait_time > 0:
-                time.sleep(wait_time)
-
-    def read(self):
+            # 佇列滿了就等主執行緒取走
+            with self.not_full:
+                while len(self.queue) >= self.queue_size and not self.stopped:
+                    self.not_full.wait(timeout=0.1)
+                clock = self.last_clock
+            if self.stopped:
+                break
+
+            # 工作區段不含上面等待主執行緒取幀的部分
+            with profile_gate.work():
+                start_time = time.time()
+                pts = self._next_pts()
+
+                # 落後音樂時鐘超過一幀（或降幀率模式的略過幀）：只 grab 不 retrieve，跳過色彩轉換與縮放
+                # （建立快取時每一幀都要寫入，不能跳）
+                skip = pts + self.frame_duration < clock or self.loop_frame_index % self.frame_step != 0
+                frames = self.cached_frames
+                if frames is not None:
+                    # 快取模式：直接取 memmap 切片（零解碼），略過的幀連放大都省掉
+                    if self.loop_frame_index >= len(frames):
+                        self.loop_offset = pts
+                        self.loop_frame_index = 0
+                        continue
+                    if skip:
+                        self.loop_frame_index += 1
+                        self.dropped_counter.inc()
+                        continue
+                    grabbed, frame = True, frames[self.loop_frame_index]
+                elif skip and self.cache_writer is None:
+                    with tracer.span("video.grab", pts=pts):
+                        grabbed = self.cap.grab()
+                    if grabbed:
+                        self.loop_frame_index += 1
+                        self.dropped_counter.inc()
+                        continue
+                    grabbed, frame = False, None
+                else:
+                    with tracer.span("video.decode", pts=pts):
+                        grabbed, frame = self.cap.read()
+
+                if not grabbed:
+                    # 影片結束：從頭循環，pts 接續累加
+                    if self.loop_frame_index == 0:
+                        break
+                    self.loop_offset = self._next_pts()
+                    self.loop_frame_index = 0
+                    if self.cache_writer is not None and self._finish_cache():
+                        # 下一輪起改從 memmap 取幀
+                        continue
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+
+                with tracer.span("video.resize"):
+                    resized = self._resize(frame)
+                    if resized is frame and frames is not None:
+                        # 快取尺寸即輸出尺寸：複製一份，佇列不持有 memmap 切片（快取淘汰時才能刪檔）
+                        resized = frame.copy()
+                    frame = resized
+                    self.loop_frame_index += 1
+                    self._write_cache(frame)
+                read_elapsed = (time.time() - start_time) * 1000
+
+                with self.lock:
+                    self.queue.append((pts, frame))
+                    self.grabbed = grabbed
+                    self.last_read_time = read_elapsed
+                self.read_hist.observe(read_elapsed)
+
+    def set_frame_step(self, step):
+        """設定每幾幀解碼一幀（1 = 全部解碼）；快取模式下略過的幀不放大"""
+        self.frame_step = max(1, int(step))
+
+    def read(self, clock=None):
+        """
+        取得 pts 最接近（且不超過）clock 的幀
+        clock: 音樂播放位置（秒）；None 代表使用 start() 後經過的時間
+        """
+        if clock is None:
+            clock = time.time() - self.start_time if self.start_time else 0.0
         with self.lock:
+            self.last_clock = clock
+            popped = 0
+            while self.queue and self.queue[0][0] <= clock:
+                self.frame_pts, self.frame = self.queue.popleft()
+                popped += 1
+            if popped == 0:
+                # 畫面更新率高於影片幀率時本來就會沿用同一幀；只有下一幀的時間已到卻還沒解碼好才算重複
+                if not self.queue and clock >= self.frame_pts + self.frame_duration:
+                    self.repeated_counter.inc()
+            else:
+                if popped > 1:
+                    self.dropped_counter.inc(popped - 1)
+                self.frame_id += 1
+                self.not_full.notify()
             return self.frame
-    
-    def read_with_stats(self):
+
+    def read_with_stats(self, clock=None):
         """回傳畫面及統計資訊"""
+        frame = self.read(clock)
         with self.lock:
-            return self.frame, self.frame_id, self.last_read_time
-    
+            return frame, self.frame_id, self.last_read_time
+
     def get_stats(self):
         """取得讀取統計"""
-        with self.lock:
-            avg = self.total_read_time / self.read_count if self.read_count > 0 else 0
-            return {
-                'read_count': self.read_count,
-                'avg_time_ms': avg,
-                'last_time_ms': self.last_read_time
-            }
+        # 指標在登錄表中跨歌曲累計
+        return {
+            'read_count': self.read_hist.count,
+            'avg_time_ms': self.read_hist.avg,
+            'last_time_ms': self.last_read_time,
+            'dropped_count': self.dropped_counter.value,
+            'repeated_count': self.repeated_counter.value
+        }
 
     def stop(self):
         self.stopped = True
+        with self.not_full:
+            self.not_full.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        if self.cache_writer is not None:
+            # 沒播完一整輪，快取不完整
+            self.cache_writer.abort()
+            self.cache_writer = None
+        if self.cached_frames is not None:
+            # 放掉 memmap 參照後才允許快取淘汰這個檔案
+            with self.lock:
+                self.cached_frames = None
+                self.frame = None
+            self.cache.release(self.cache_key)
         self.cap.release()
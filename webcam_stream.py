@@ -1,6 +1,9 @@
 import cv2
 import time
 import threading
+from tracer import tracer
+from metrics import registry
+from utils import profile_gate
 
 
 class WebcamStream:
@@ -18,12 +21,11 @@ class WebcamStream:
         # 計時與追蹤
         self.frame_id = 0            # 幀 ID
         self.last_read_time = 0      # 上次讀取耗時 (ms)
-        self.read_count = 0          # 已讀取幀數
-        self.total_read_time = 0     # 總讀取時間
+        self.read_hist = registry.histogram("camera.read_ms", description="攝影機讀取")
         self.lock = threading.Lock()
 
     def start(self):
-        threading.Thread(target=self.update, args=(), daemon=True).start()
+        threading.Thread(target=self.update, args=(), daemon=True, name="WebcamStream").start()
         return self
 
     def update(self):
@@ -32,16 +34,18 @@ class WebcamStream:
                 return
             
             start_time = time.time()
-            (grabbed, frame) = self.stream.read()
+            with tracer.span("camera.read", frame_id=self.frame_id + 1):
+                (grabbed, frame) = self.stream.read()
             elapsed = (time.time() - start_time) * 1000
             
-            with self.lock:
-                self.grabbed = grabbed
-                self.frame = frame
-                self.frame_id += 1
-                self.last_read_time = elapsed
-                self.read_count += 1
-                self.total_read_time += elapsed
+            # stream.read() 大多時間在等攝影機，不納入工作區段；只包住之後的處理
+            with profile_gate.work():
+                with self.lock:
+                    self.grabbed = grabbed
+                    self.frame = frame
+                    self.frame_id += 1
+                    self.last_read_time = elapsed
+                self.read_hist.observe(elapsed)
 
     def read(self):
         with self.lock:
@@ -54,13 +58,11 @@ class WebcamStream:
     
     def get_stats(self):
         """取得讀取統計"""
-        with self.lock:
-            avg = self.total_read_time / self.read_count if self.read_count > 0 else 0
-            return {
-                'read_count': self.read_count,
-                'avg_time_ms': avg,
-                'last_time_ms': self.last_read_time
-            }
+        return {
+            'read_count': self.read_hist.count,
+            'avg_time_ms': self.read_hist.avg,
+            'last_time_ms': self.last_read_time
+        }
 
     def stop(self):
         self.stopped = True